@@ -1,12 +1,15 @@
 import os
+import time
 import datetime
 import numpy as np
 
 from app import simulator
+from app.history import RunHistory
+from app.stopping import StoppingPolicy
+from app.surrogate import SurrogateModel
+from app.writer import AsyncWriter
 from creatures import population
-from creatures.evolution import Selection
 
-eval_fitness = Selection.eval_fitness 
 now = datetime.datetime.now
 
 class MainApp:
@@ -15,6 +18,13 @@ class MainApp:
                  load_progress:bool = False,
                  multiprocess:bool = True,
                  pool_size:int = 5,
+                 urdf_mode:str = "file",
+                 world_mode:str = "reset",
+                 batch_size:int = 1,
+                 cache_size:int = 0,
+                 stopping:StoppingPolicy = None,
+                 sample_every:int = 1,
+                 surrogate:SurrogateModel = None,
                  max_frame:int = 1200,
                  incremental:bool = False,
                  population_size:int = 5,
@@ -28,7 +38,10 @@ class MainApp:
                  max_growth_rt:float = 1.1,
                  mutation_freq:float = 0.1,
                  mutation_amnt:float = 0.1,
-                 dist_limit_rt:float = 1.025) -> None:
+                 dist_limit_rt:float = 1.025,
+                 seed:int = None,
+                 max_pending_writes:int = 4,
+                 island:int = None) -> None:
         if base_dir is None:
             raise Exception("`base_dir` cannot be empty.")
         
@@ -36,6 +49,13 @@ class MainApp:
         self.base_dir = base_dir
         self.multiprocess = multiprocess
         self.pool_size = pool_size
+        self.urdf_mode = urdf_mode
+        self.world_mode = world_mode
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.stopping = stopping
+        self.sample_every = sample_every
+        self.surrogate = surrogate
         self.min_frame = int(max_frame / 10)
         self.max_frame = max_frame
         self.incremental = incremental
@@ -52,48 +72,100 @@ class MainApp:
         self.mutation_freq = mutation_freq
         self.mutation_amnt = mutation_amnt
         self.dist_limit_rt = dist_limit_rt
+        # a missing seed is drawn once and kept, so the run can still be replayed
+        self.seed = np.random.SeedSequence(seed).entropy
+        # islands of one run share the seed and draw from their own streams
+        self.island = island
+        # islands run side by side, so each writes its URDFs to its own folder
+        self.urdf_dir = ".urdf/" if island is None else f".urdf/island_{island}/"
+        self.rng = None
         self.pop = None
         self.sim = None
+        self.history = None
+        self.writer = None
+        # throughput of the physics evaluation
+        self.eval_time = 0
+        self.n_evaluated = 0
+        # last generation the surrogate learnt from
+        self.trained_generation = None
 
-        # instantiate pop and sim
+        # instantiate pop and sim; simulator workers are forked before the
+        # writer thread starts, so they never inherit its locks
         self.build_simulator()
+        self.history = RunHistory(os.path.join(self.base_dir, "history.db"))
+        # checkpoints, reports and logs are written while the next generation runs
+        self.writer = AsyncWriter(max_pending_writes)
         self.reset_population()
         
         self.save_population()
-        self.sim.eval_population(self.pop, self.max_frame)
+        self.eval_population(self.max_frame)
         self.generate_report()
         
         if load_progress and os.path.exists(os.path.join(self.base_dir, "pop")):
             self.load_population()
         
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        # the simulator and history are released even if a pending write failed
+        try:
+            if self.writer is not None:
+                writer, self.writer = self.writer, None
+                writer.close()
+        finally:
+            try:
+                if self.sim is not None:
+                    sim, self.sim = self.sim, None
+                    sim.close()
+            finally:
+                if self.history is not None:
+                    history, self.history = self.history, None
+                    history.close()
+
     def build_simulator(self) -> None:
         if ((self.multiprocess == False and self.pool_size > 1) or
             (self.multiprocess == True and self.pool_size < 2)):         
             raise Exception(f"Multiprocess cannot {self.multiprocess} " +
                             f"while pool size is {self.pool_size}")
 
-        # delete simulator object(s)
+        # release simulator worker(s) and physics client(s)
         if self.sim is not None:
-            if type(self.sim) == simulator.MultiSimulator:
-                for sim in self.sim.sims:
-                    del sim
-            del self.sim
+            self.sim.close()
+            self.sim = None
 
         # instantiate new simulator       
         if self.multiprocess:
-            self.sim = simulator.MultiSimulator(self.pool_size)
+            self.sim = simulator.MultiSimulator(self.pool_size, self.urdf_mode, self.cache_size, self.stopping, self.sample_every,
+                                                self.world_mode, self.batch_size)
         else:
-            self.sim = simulator.Simulator()
+            self.sim = simulator.Simulator(urdf_mode = self.urdf_mode, cache_size = self.cache_size,
+                                           policy = self.stopping, sample_every = self.sample_every,
+                                           world_mode = self.world_mode, batch_size = self.batch_size)
             
     def reset_population(self) -> None:      
         # Instatiate population
+        self.rng = self.get_rng(self.current_generation, *self.get_rng_keys())
         if self.pop == None:
             self.pop = population.Population(
                 population_size = self.population_size,
-                default_gene_count = self.default_gene_count
+                default_gene_count = self.default_gene_count,
+                rng = self.rng
             )
         else:
-            self.pop.reset_population()
+            self.pop.reset_population(rng = self.rng)
+        self.trained_generation = None
+
+    def get_rng(self, generation:int, *keys:int) -> np.random.Generator:
+        # an independent stream per generation, and per worker or island when
+        # `keys` are given, derived from the seed alone
+        return np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key = (generation,) + keys))
+
+    def get_rng_keys(self) -> tuple:
+        return () if self.island is None else (self.island,)
         
     def run(self,
             save_after:bool = False,
@@ -102,7 +174,10 @@ class MainApp:
             report_each:int = None,
             log_after:bool = False,
             log_each:int = None,
-            log_console:bool = False) -> None:
+            log_console:bool = False,
+            migrate = None) -> None:
+        # `migrate(app)`, when given, is called once a generation has been
+        # evaluated and written, before the next one is bred
             
         self.print_setting(save_after, save_each, report_after, report_each, \
                            log_after, log_each, log_console)
@@ -111,18 +186,26 @@ class MainApp:
         while self.current_generation < self.num_of_generation:
             if self.incremental and self.current_generation < 0.8 * self.num_of_generation:
                 num_frame = int(self.min_frame + self.current_generation * self.increment_frame)
-                self.sim.eval_population(self.pop, num_frame)
+                self.eval_population(num_frame)
             else:
-                self.sim.eval_population(self.pop, self.max_frame)
+                self.eval_population(self.max_frame)
             
-            if save_each is not None and self.current_generation % save_each == 0:
-                self.save_population()
-            if report_each is not None and self.current_generation % report_each == 0:
-                self.generate_report()
-            if log_each is not None and self.current_generation % log_each == 0:
-                self.print_log(log_console)
+            save = save_each is not None and self.current_generation % save_each == 0
+            report = report_each is not None and self.current_generation % report_each == 0
+            log = log_each is not None and self.current_generation % log_each == 0
+            # metrics are computed once and shared by the writes of this generation
+            snapshot = self.pop.get_snapshot() if save or report or log else None
+            if save:
+                self.save_population(snapshot)
+            if report:
+                self.generate_report(snapshot)
+            if log:
+                self.print_log(log_console, snapshot)
+            if migrate is not None:
+                migrate(self)
 
             self.current_generation += 1
+            self.rng = self.get_rng(self.current_generation, *self.get_rng_keys())
             self.pop.new_generation(
                 self.num_of_elites,
                 self.num_of_random,
@@ -131,59 +214,140 @@ class MainApp:
                 self.mutation_freq,
                 self.mutation_amnt,
                 self.max_growth_rt,
-                self.dist_limit_rt
+                self.dist_limit_rt,
+                self.rng,
+                self.surrogate
             )
         
-        self.sim.eval_population(self.pop, self.max_frame)
+        self.eval_population(self.max_frame)
+        snapshot = self.pop.get_snapshot() if log_after or report_after or save_after else None
             
         if log_after:
-            self.print_log(log_console = True)
+            self.print_log(True, snapshot)
 
         # generate report after simulation
         if report_after: 
-            self.generate_report()
+            self.generate_report(snapshot)
             
-        # save csvs after simulation
+        # save checkpoint after simulation
         if save_after:
-            self.save_population()
-        
-    def save_population(self) -> None:        
-        save_path = os.path.join(self.base_dir, "pop", str(self.current_generation))
+            self.save_population(snapshot)
+
+        self.flush()
+
+    def flush(self) -> None:
+        # wait until everything submitted so far is on disk
+        self.writer.flush()
+        self.writer.submit(self.history.flush)
+        self.writer.flush()
         
-        if not os.path.exists(save_path):
-            os.makedirs(save_path, exist_ok = True)
+    def eval_population(self, num_frame:int) -> None:
+        # creatures that cannot beat the best distance of the last generation
+        # may be stopped early
+        if self.stopping is not None:
+            self.stopping.elite_distance = self.pop.max_dist
+        start_time = time.perf_counter()
+        self.sim.eval_population(self.pop, num_frame, self.urdf_dir)
+        self.eval_time += time.perf_counter() - start_time
+        self.n_evaluated += len(self.pop.creatures)
+        self.train_surrogate()
+
+    def train_surrogate(self) -> None:
+        # the children picked by the surrogate are scored against their
+        # simulated distances before the model learns from them; copies of
+        # elites and random picks were learnt from when they were new, and a
+        # generation evaluated again is not learnt from twice
+        if self.surrogate is None or self.trained_generation == self.current_generation:
+            return
+        self.trained_generation = self.current_generation
+        arena = self.pop.sync_arena()
+        distances = np.array([cr.get_distance() for cr in self.pop.creatures])
+        parents = self.pop.parents
+        children = np.flatnonzero(parents[:, 1] >= 0)
+        fresh = np.flatnonzero((parents[:, 0] < 0) | (parents[:, 1] >= 0))
+        self.surrogate.score(distances[children], children)
+        if len(fresh) > 0:
+            self.surrogate.update(arena.dna[fresh], arena.lengths[fresh], distances[fresh])
+
+    def save_population(self, snapshot:dict = None) -> None:        
+        save_path = os.path.join(self.base_dir, "pop", f"{self.current_generation}.npz")
+        snapshot = self.pop.get_snapshot() if snapshot is None else snapshot
         
-        self.pop.to_csvs(base_folder = save_path, identifier = "cr")
+        self.writer.submit(population.Population.write_checkpoint, save_path, snapshot,
+                           self.current_generation, self.get_state())
     
     def load_population(self, current_generation = None) -> None:
+        self.flush()
+        pop_path = os.path.join(self.base_dir, "pop")
         if current_generation is not None:
             self.current_generation = current_generation
         else: 
-            self.current_generation = max([int(d) for d in os.listdir(self.base_dir + "/pop")])
-        load_path = os.path.join(self.base_dir, "pop", str(self.current_generation))
+            self.current_generation = max([int(d.split(".")[0]) for d in os.listdir(pop_path)
+                                           if d.isdigit() or d.endswith(".npz")])
+        load_path = os.path.join(pop_path, f"{self.current_generation}.npz")
         
-        self.pop.from_csvs(base_folder = load_path, identifier = "cr")
+        if os.path.exists(load_path):
+            _, state = self.pop.from_checkpoint(load_path)
+            self.set_state(state)
+        else:
+            # older runs saved one CSV per creature in a folder per generation
+            self.pop.from_csvs(base_folder = os.path.join(pop_path, str(self.current_generation)), identifier = "cr")
+        self.trained_generation = None
+
+    def convert_population(self) -> None:
+        # rewrite every CSV folder under `pop` as a checkpoint file
+        pop_path = os.path.join(self.base_dir, "pop")
+        for d in os.listdir(pop_path):
+            csv_path = os.path.join(pop_path, d)
+            if os.path.isdir(csv_path) and not os.path.exists(csv_path + ".npz"):
+                population.Population.csvs_to_checkpoint(csv_path, csv_path + ".npz", "cr", int(d))
+
+    def get_state(self) -> dict:
+        # what a resumed run needs besides the DNA to replay identically; the
+        # generator of every generation is derived again from the seed
+        return {
+            "seed": self.seed,
+            "max_dist": float(self.pop.max_dist),
+        }
+
+    def set_state(self, state:dict) -> None:
+        # checkpoints converted from CSV folders only hold the DNA
+        if len(state) == 0:
+            return
+        self.seed = state["seed"]
+        self.pop.max_dist = state["max_dist"]
+        self.rng = self.get_rng(self.current_generation, *self.get_rng_keys())
         
-    def generate_report(self) -> None:        
-        report_path = os.path.join(self.base_dir, "report", str(self.current_generation))
+    def generate_report(self, snapshot:dict = None) -> None:        
+        snapshot = self.pop.get_snapshot() if snapshot is None else snapshot
         
-        self.pop.generate_report(self.current_generation, report_path)
+        self.writer.submit(self.history.append,
+                           self.current_generation,
+                           snapshot["n_exp_links"],
+                           snapshot["n_flat_links"],
+                           snapshot["distances"],
+                           snapshot["fitness"],
+                           snapshot["parents"])
         
-    def print_log(self, log_console = False):
-        log_path = os.path.join(self.base_dir, "log.txt")
+    def print_log(self, log_console = False, snapshot:dict = None):
+        snapshot = self.pop.get_snapshot() if snapshot is None else snapshot
         
-        n_ex_link = np.mean([len(cr.get_expanded_links()) for cr in self.pop.creatures])
-        n_fl_link = np.mean([len(cr.get_flat_links()) for cr in self.pop.creatures])
-        max_ex_link = max([len(cr.get_expanded_links()) for cr in self.pop.creatures])
-        max_fl_link = max([len(cr.get_flat_links()) for cr in self.pop.creatures])
-        dists = np.mean([cr.get_distance() for cr in self.pop.creatures])
-        fits  = np.mean(eval_fitness(self.pop.creatures))
-        zonk  = np.sum(dists == 0)
+        n_ex_link = np.mean(snapshot["n_exp_links"])
+        n_fl_link = np.mean(snapshot["n_flat_links"])
+        max_ex_link = np.max(snapshot["n_exp_links"])
+        max_fl_link = np.max(snapshot["n_flat_links"])
+        dists = np.mean(snapshot["distances"])
+        fits  = np.mean(snapshot["fitness"])
+        zonk  = np.sum(snapshot["distances"] == 0)
 
         if self.incremental and self.current_generation < 0.8 * self.num_of_generation:
             num_frame = int(self.min_frame + self.current_generation * self.increment_frame)
         else:
             num_frame = self.max_frame
+        # cached results were stopped, and counted, when first simulated
+        _, saved_frames = StoppingPolicy.summarise([self.sim.results[i] for i in self.sim.simulated], num_frame)
+        screened_out = 0 if self.surrogate is None else self.surrogate.n_screened_out
+        correlation = np.nan if self.surrogate is None else self.surrogate.correlation
 
         text = "".join([
             f"{now()},",
@@ -195,9 +359,18 @@ class MainApp:
             f"{max_ex_link},".rjust(10, " "),
             f"{max_fl_link},".rjust(10, " "),
             f"{zonk},".rjust(10, " "),
-            f"{num_frame},".rjust(10, " ")       
+            f"{num_frame},".rjust(10, " "),
+            f"{saved_frames},".rjust(10, " "),
+            f"{self.pop.n_repaired},".rjust(10, " "),
+            f"{screened_out},".rjust(10, " "),
+            f"{correlation:.2f}".rjust(10, " ")
         ])
         
+        self.writer.submit(self.write_log, text, log_console)
+
+    def write_log(self, text:str, log_console = False) -> None:
+        log_path = os.path.join(self.base_dir, "log.txt")
+        
         if log_console: print(text)
         
         with open(log_path, "a") as f:
@@ -214,8 +387,17 @@ class MainApp:
         setting_path = os.path.join(self.base_dir, "settings.txt")
         
         text = "\n".join([
+            f"Seed: {self.seed}",
+            f"Island: {self.island}",
             f"Multiprocess: {self.multiprocess}",
             f"Pool Size: {self.pool_size}",
+            f"URDF Mode: {self.urdf_mode}",
+            f"World Mode: {self.world_mode}",
+            f"Batch Size: {self.batch_size}",
+            f"Cache Size: {self.cache_size}",
+            f"Stopping Policy: {self.stopping}",
+            f"Sample Every: {self.sample_every}",
+            f"Surrogate: {self.surrogate}",
             f"Max Frame: {self.max_frame}",
             f"Directory: {self.base_dir}",
             f"Save After: {save_after}",
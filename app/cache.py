@@ -0,0 +1,49 @@
+import hashlib
+import numpy as np
+from collections import OrderedDict
+
+
+class FitnessCache:
+    def __init__(self, max_size:int = 1024):
+        assert 0 < max_size
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        # evict the least recently used entries
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last = False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get_hit_rate(self):
+        if self.hits + self.misses == 0:
+            return 0.0
+        return self.hits / (self.hits + self.misses)
+
+    @staticmethod
+    def get_key(dna:np.ndarray, max_frame:int, params:tuple = ()):
+        dna = np.ascontiguousarray(dna, dtype = np.float64)
+        digest = hashlib.sha1(dna.tobytes()).hexdigest()
+        return (digest, dna.shape, max_frame) + tuple(params)
@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+import numpy as np
+
+
+class RunHistory:
+    # one row per creature per generation; reporting a generation again
+    # replaces its rows, as a resumed run may repeat a few generations
+    __fields = (("generation", np.int64),
+                ("creature", np.int64),
+                ("n_exp_links", np.int64),
+                ("n_flat_links", np.int64),
+                ("distance", np.float64),
+                ("fitness", np.float64),
+                ("parent1", np.int64),
+                ("parent2", np.int64))
+
+    def __init__(self, path:str, buffer_size:int = 1024):
+        assert 0 < buffer_size
+        dirname = os.path.dirname(path)
+        if dirname != "" and not os.path.exists(dirname):
+            os.makedirs(dirname, exist_ok = True)
+        self.path = path
+        self.buffer_size = buffer_size
+        self.buffer = []
+        # appends may come from a writer thread, reads from the owner; the
+        # lock guards both the buffer and the connection
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread = False)
+        columns = ", ".join(f"{name} {'REAL' if dtype == np.float64 else 'INTEGER'}" for name, dtype in RunHistory.__fields)
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS history ({columns}, PRIMARY KEY (generation, creature))")
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        with self.lock:
+            self.__flush()
+            return self.connection.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.__flush()
+                self.connection.close()
+                self.connection = None
+
+    def append(self, generation:int, n_exp_links, n_flat_links, distances, fitness, parents = None):
+        if parents is None:
+            parents = np.full((len(distances), 2), -1)
+        rows = []
+        for i, row in enumerate(zip(np.asarray(n_exp_links).tolist(),
+                                    np.asarray(n_flat_links).tolist(),
+                                    np.asarray(distances, dtype = np.float64).tolist(),
+                                    np.asarray(fitness, dtype = np.float64).tolist(),
+                                    np.asarray(parents).tolist())):
+            n_exp_link, n_flat_link, distance, fit, (parent1, parent2) = row
+            rows.append((int(generation), i, n_exp_link, n_flat_link, distance, fit, parent1, parent2))
+        with self.lock:
+            self.buffer.extend(rows)
+            if len(self.buffer) >= self.buffer_size:
+                self.__flush()
+
+    def flush(self):
+        with self.lock:
+            self.__flush()
+
+    def __flush(self):
+        # callers hold the lock
+        if len(self.buffer) == 0:
+            return
+        placeholders = ", ".join("?" * len(RunHistory.__fields))
+        self.connection.executemany(f"INSERT OR REPLACE INTO history VALUES ({placeholders})", self.buffer)
+        self.connection.commit()
+        self.buffer = []
+
+    def read(self, start:int = None, stop:int = None):
+        # rows of generations in [start, stop) as a structured array
+        start = np.iinfo(np.int64).min if start is None else start
+        stop = np.iinfo(np.int64).max if stop is None else stop
+        with self.lock:
+            self.__flush()
+            rows = self.connection.execute(
+                "SELECT * FROM history WHERE generation >= ? AND generation < ? ORDER BY generation, creature",
+                (int(start), int(stop))
+            ).fetchall()
+        return np.array(rows, dtype = RunHistory.get_dtype())
+
+    def get_generations(self):
+        with self.lock:
+            self.__flush()
+            rows = self.connection.execute("SELECT DISTINCT generation FROM history ORDER BY generation").fetchall()
+        return np.array([row[0] for row in rows], dtype = np.int64)
+
+    @staticmethod
+    def get_dtype():
+        return np.dtype(list(RunHistory.__fields))
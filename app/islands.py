@@ -0,0 +1,202 @@
+import os
+import sys
+import time
+import queue
+import signal
+import numpy as np
+from multiprocessing import Array, Event, Process, Queue
+
+from app.app import MainApp
+
+
+class IslandModel:
+    # `num_of_islands` populations, each a `MainApp` in its own process with
+    # its own simulator pool, evolve apart and send their `num_of_migrants`
+    # fittest creatures to another island every `migrate_each` generations.
+    #   ring   : island i sends to island i + 1
+    #   random : a random cycle through all islands, drawn again every
+    #            migration from the shared seed, so every island draws the same
+    # Migrants travel as DNA arrays through one inbox queue per island. An
+    # island waits at most `migration_timeout` seconds for its migrants, or
+    # for no limit when it is None
+    def __init__(self,
+                 base_dir:str,
+                 num_of_islands:int = 4,
+                 migrate_each:int = 10,
+                 num_of_migrants:int = 2,
+                 topology:str = "ring",
+                 seed:int = None,
+                 migration_timeout:float = 3600,
+                 **settings):
+        if base_dir is None:
+            raise Exception("`base_dir` cannot be empty.")
+        if topology not in IslandModel.get_topologies():
+            raise Exception(f"Topology must be one of {IslandModel.get_topologies()}.")
+        assert 0 < num_of_islands and 0 < migrate_each and 0 < num_of_migrants
+        for key in ("base_dir", "seed", "island"):
+            if key in settings:
+                raise Exception(f"`{key}` is set per island.")
+        self.base_dir = base_dir
+        self.num_of_islands = num_of_islands
+        self.migrate_each = migrate_each
+        self.num_of_migrants = num_of_migrants
+        self.topology = topology
+        self.migration_timeout = migration_timeout
+        self.seed = np.random.SeedSequence(seed).entropy
+        self.settings = settings
+        self.stats = []
+
+    def run(self, **run_args) -> list[dict]:
+        # arguments are passed to `MainApp.run` of every island; returns the
+        # throughput of every island
+        inboxes = [Queue() for _ in range(self.num_of_islands)]
+        result_queue = Queue()
+        # set when an island fails, so the others stop waiting for migrants
+        # and close their apps; islands also publish the generation they
+        # start at, as resumed islands may start at different ones
+        stop = Event()
+        starts = Array("q", [-1] * self.num_of_islands)
+        workers = []
+        for island in range(self.num_of_islands):
+            worker = Process(target = IslandModel.static_worker,
+                             args = (island, self.base_dir, self.seed, self.settings, run_args,
+                                     self.num_of_islands, self.migrate_each, self.num_of_migrants,
+                                     self.topology, self.migration_timeout, inboxes, result_queue, stop, starts))
+            worker.start()
+            workers.append(worker)
+
+        stats = []
+        error = None
+        try:
+            pending = set(range(self.num_of_islands))
+            while len(pending) > 0:
+                try:
+                    island, result = result_queue.get(timeout = 1)
+                except queue.Empty:
+                    for island in list(pending):
+                        if not workers[island].is_alive() and workers[island].exitcode != 0:
+                            pending.discard(island)
+                            error = error or Exception(f"Island {island} has terminated unexpectedly.")
+                            stop.set()
+                    continue
+                pending.discard(island)
+                if isinstance(result, Exception):
+                    # the first error is the cause, the others are islands stopping
+                    error = error or result
+                    stop.set()
+                else:
+                    stats.append(result)
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join(30)
+            # a stuck island is terminated as a last resort; its SIGTERM
+            # handler still closes its app and with it the simulator workers
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join(30)
+            for q in inboxes + [result_queue]:
+                q.close()
+        if error is not None:
+            raise error
+
+        self.stats = sorted(stats, key = lambda island_stats: island_stats["island"])
+        self.print_stats()
+        return self.stats
+
+    def print_stats(self) -> None:
+        os.makedirs(self.base_dir, exist_ok = True)
+        keys = IslandModel.get_stat_keys()
+        rows = [",".join(keys)]
+        for island_stats in self.stats:
+            rows.append(",".join(f"{island_stats[key]:.3f}" if isinstance(island_stats[key], float) else str(island_stats[key])
+                                 for key in keys))
+        with open(os.path.join(self.base_dir, "islands.txt"), "w") as f:
+            f.write("\n".join(rows) + "\n")
+
+    @staticmethod
+    def get_topologies():
+        return ("ring", "random")
+
+    @staticmethod
+    def get_stat_keys():
+        return ("island", "generations", "evaluated", "migrations", "eval_time", "wait_time", "wall_time",
+                "creatures_per_sec", "max_distance")
+
+    @staticmethod
+    def get_targets(topology:str, num_of_islands:int, rng:np.random.Generator = None):
+        # the island every island sends its migrants to; each island also
+        # receives from exactly one island
+        if topology == "ring":
+            return (np.arange(num_of_islands) + 1) % num_of_islands
+        rng = np.random.default_rng() if rng is None else rng
+        order = rng.permutation(num_of_islands)
+        targets = np.empty(num_of_islands, dtype = int)
+        targets[order] = np.roll(order, -1)
+        return targets
+
+    @staticmethod
+    def static_worker(island:int, base_dir:str, seed:int, settings:dict, run_args:dict,
+                      num_of_islands:int, migrate_each:int, num_of_migrants:int, topology:str,
+                      migration_timeout:float, inboxes:list[Queue], result_queue:Queue, stop:Event, starts:Array):
+        # SIGTERM unwinds the `with` block below, so the app still closes
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+        try:
+            start_time = time.perf_counter()
+            # migrants may arrive a round early from an island that is ahead
+            received = {}
+            counters = {"migrations": 0, "wait_time": 0.0}
+            rounds = {"first": 0}
+
+            def wait(done, timeout:float = None):
+                # polls `done` until it holds, another island failed or `timeout` passed
+                wait_start = time.perf_counter()
+                while not done():
+                    if stop.is_set():
+                        raise Exception(f"Island {island} stopped as another island failed.")
+                    if timeout is not None and time.perf_counter() - wait_start > timeout:
+                        raise Exception(f"Island {island} timed out waiting for the other islands.")
+                    try:
+                        sent_generation, migrants = inboxes[island].get(timeout = 1)
+                        received[sent_generation] = migrants
+                    except queue.Empty:
+                        pass
+                return time.perf_counter() - wait_start
+
+            def migrate(app:MainApp):
+                generation = app.current_generation
+                if (num_of_islands < 2 or generation == 0 or generation % migrate_each != 0
+                    or generation < rounds["first"]):
+                    return
+                # every island draws the same targets from the stream without an island key
+                targets = IslandModel.get_targets(topology, num_of_islands, app.get_rng(generation))
+                inboxes[targets[island]].put((generation, app.pop.get_migrants(num_of_migrants)))
+                counters["wait_time"] += wait(lambda: generation in received, migration_timeout)
+                app.pop.add_migrants(received.pop(generation))
+                counters["migrations"] += 1
+
+            with MainApp(base_dir = os.path.join(base_dir, f"island_{island}"), seed = seed, island = island,
+                         **settings) as main:
+                # only generations every island still has to run migrate, so
+                # islands resumed at different generations never wait in vain
+                starts[island] = main.current_generation
+                wait(lambda: min(starts) >= 0, migration_timeout)
+                rounds["first"] = max(starts)
+
+                main.run(migrate = migrate, **run_args)
+                wall_time = time.perf_counter() - start_time
+                stats = {
+                    "island": island,
+                    "generations": main.current_generation,
+                    "evaluated": main.n_evaluated,
+                    "migrations": counters["migrations"],
+                    "eval_time": main.eval_time,
+                    "wait_time": counters["wait_time"],
+                    "wall_time": wall_time,
+                    "creatures_per_sec": main.n_evaluated / wall_time,
+                    "max_distance": float(np.max([cr.get_distance() for cr in main.pop.creatures])),
+                }
+            result_queue.put((island, stats))
+        except Exception as e:
+            result_queue.put((island, e))
@@ -1,101 +1,476 @@
 import os
+import copy
+import time
+import queue
+import numpy as np
 import pybullet as p
-from multiprocessing import Pool
+from multiprocessing import Process, Queue, resource_tracker
+from app.cache import FitnessCache
+from app.stopping import StoppingPolicy
 from creatures import population, creature
+from creatures.arena import DNAArena
+
+class RunResult:
+    __slots__ = ("last_position", "frames", "reason")
+
+    def __init__(self, last_position:tuple, frames:int, reason:str):
+        self.last_position = last_position
+        self.frames = frames
+        self.reason = reason
+
+    def __repr__(self):
+        return f"Run Result\nPosition\t: {self.last_position}\nFrames\t: {self.frames}\nReason\t: {self.reason}\n"
 
 class Simulator:
-    def __init__(self, sim_id:int = 0):
+    # `batch_size` creatures share one physics world. Their fitness is not the
+    # fitness they would get alone: it changes with their batch mates and slot
+    # order, so batched runs cannot be cached and are not comparable with
+    # runs of `batch_size = 1`
+    def __init__(self, sim_id:int = 0, urdf_mode:str = "file", cache_size:int = 0, policy:StoppingPolicy = None, sample_every:int = 1,
+                 world_mode:str = "reset", batch_size:int = 1, spacing:float = 20):
+        if urdf_mode not in Simulator.get_urdf_modes():
+            raise Exception(f"Invalid URDF mode: {urdf_mode}")
+        if world_mode not in Simulator.get_world_modes():
+            raise Exception(f"Invalid world mode: {world_mode}")
+        if sample_every < 1:
+            raise Exception(f"Invalid sampling stride: {sample_every}")
+        if batch_size < 1 or batch_size > Simulator.get_max_batch_size():
+            raise Exception(f"Invalid batch size: {batch_size}")
+        if batch_size > 1 and cache_size > 0:
+            raise Exception("A fitness cache cannot be used with batches of more than one creature.")
+        if urdf_mode == "memory" and not Simulator.supports_memory_urdf():
+            raise Exception("URDF mode memory needs os.memfd_create and /proc, which only Linux provides.")
         self.client_id = p.connect(p.DIRECT)
         self.sim_id = sim_id
+        self.urdf_mode = urdf_mode
+        self.world_mode = world_mode
+        self.world_state = None
+        self.plane = None
+        self.robots = []
+        self.policy = policy
+        self.sample_every = sample_every
+        self.batch_size = batch_size
+        self.spacing = spacing
+        self.memfd = None
+        self.cache = FitnessCache(cache_size) if cache_size > 0 else None
+        self.results = []
+        # indices of the creatures simulated rather than read from the cache
+        self.simulated = []
 
-    def run_creature(self, cr:creature.Creature, filename:str = "robot.urdf", max_frame:int = 2400, dirname = ".urdf/"):
+    def __enter__(self):
+        return self
 
-        cr_xml_path = f"{dirname}/sim_" + str(self.sim_id) + "_" + filename
-        cr.write_xml(cr_xml_path)
-        # if cr.get_distance() is not 0: return
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
-        client_id = self.client_id
+    def close(self):
+        if self.client_id is not None:
+            p.disconnect(physicsClientId = self.client_id)
+            self.client_id = None
+            self.world_state = None
+            self.plane = None
+            self.robots = []
+        if self.memfd is not None:
+            os.close(self.memfd)
+            self.memfd = None
+
+    def write_xml(self, cr:creature.Creature, filename:str = "robot.urdf", dirname = ".urdf/"):
+        if self.urdf_mode == "file":
+            cr_xml_path = f"{dirname}/sim_" + str(self.sim_id) + "_" + filename
+            cr.write_xml(cr_xml_path)
+            return cr_xml_path
 
-        p.resetSimulation(physicsClientId = client_id)
-        p.setPhysicsEngineParameter(enableFileCaching = 0, physicsClientId = client_id)
-        p.setGravity(0, 0, -10, physicsClientId = client_id)
+        # "memory" mode: the URDF lives in an anonymous in-memory file that is
+        # reused for every creature, and PyBullet reads it through /proc
+        if self.memfd is None:
+            self.memfd = os.memfd_create(f"sim_{self.sim_id}_{filename}")
+        xml_bytes = cr.get_urdf().encode()
+        os.ftruncate(self.memfd, 0)
+        # a single write may stop short
+        written = 0
+        while written < len(xml_bytes):
+            written += os.pwrite(self.memfd, xml_bytes[written:], written)
+        return f"/proc/self/fd/{self.memfd}"
 
-        plane_shape = p.createCollisionShape(p.GEOM_PLANE, physicsClientId = client_id)
-        plane = p.createMultiBody(plane_shape, plane_shape, physicsClientId = client_id)
-        robot = p.loadURDF(cr_xml_path, physicsClientId = client_id)
+    def run_creature(self, cr:creature.Creature, filename:str = "robot.urdf", max_frame:int = 2400, dirname = ".urdf/"):
+        return self.run_creatures([cr], filename, max_frame, dirname)[0]
 
-        p.resetBasePositionAndOrientation(robot, (0, 0, 2.5), (0, 0, 0, 1), physicsClientId = client_id)
+    def run_creatures(self, creatures:list[creature.Creature], filename:str = "robot.urdf", max_frame:int = 2400, dirname = ".urdf/"):
+        # every creature is loaded into the same world, `spacing` apart along
+        # the y axis and unable to touch each other, so that one physics step
+        # advances all of them; positions are reported relative to the spot
+        # each creature was dropped at
+        client_id = self.client_id
+        robots = self.load_robots(creatures, filename, dirname)
+        offsets = [(0, k * self.spacing, 0) for k in range(len(robots))]
+        for robot, offset in zip(robots, offsets):
+            p.resetBasePositionAndOrientation(robot, (offset[0], offset[1], 2.5), (0, 0, 0, 1), physicsClientId = client_id)
+        if len(robots) > 1:
+            self.filter_collisions(robots)
 
+        motor_banks = [cr.get_motor_bank() for cr in creatures]
+        joint_ids = [list(range(len(motor_bank))) for motor_bank in motor_banks]
+        forces = [[5] * len(motor_bank) for motor_bank in motor_banks]
+
+        policies = [None] * len(robots)
+        if self.policy is not None:
+            policies = [copy.copy(self.policy) for _ in robots]
+            for policy in policies:
+                policy.reset()
+        policy = self.policy
+
+        # the base position is only read every `sample_every` frames and on the
+        # last frame, so the final position is exact. A run is marked invalid
+        # at the first sampled frame where the base is above or below the
+        # limits, which is at most `sample_every - 1` frames after stride 1
+        # would have caught it, and a creature that leaves and re-enters the
+        # limits between two samples is not caught at all
+        sample_every = self.sample_every
+        last_positions = [(0, 0, 0)] * len(robots)
+        frames = [max_frame] * len(robots)
+        reasons = ["complete"] * len(robots)
+        active = list(range(len(robots)))
         for i in range(max_frame):
             if i % 240 == 0:
-                for joint_id, joint_motor in enumerate(cr.get_motors()):
-                    p.setJointMotorControl2(
-                        robot, 
-                        joint_id, 
-                        controlMode = p.VELOCITY_CONTROL, 
-                        targetVelocity = joint_motor(),
-                        force = 5, 
-                        physicsClientId = client_id
-                    )
+                for k in active:
+                    if len(motor_banks[k]) > 0:
+                        p.setJointMotorControlArray(
+                            robots[k],
+                            joint_ids[k],
+                            controlMode = p.VELOCITY_CONTROL,
+                            targetVelocities = motor_banks[k]().tolist(),
+                            forces = forces[k],
+                            physicsClientId = client_id
+                        )
             p.stepSimulation(physicsClientId = client_id)
 
-            # Sometimes PyBullet gives an error loading cratures with too many parts
-            try:
-                last_position, _ = p.getBasePositionAndOrientation(robot, physicsClientId = client_id)
-            except:
-                last_position = (0, 0, 0)
+            check = policy is not None and (i + 1) % policy.check_every == 0
+            if not check and (i + 1) % sample_every != 0 and i + 1 != max_frame:
+                continue
+
+            for k in list(active):
+                # Sometimes PyBullet gives an error loading cratures with too many parts
+                try:
+                    last_position, _ = p.getBasePositionAndOrientation(robots[k], physicsClientId = client_id)
+                except:
+                    reasons[k] = "error"
+                else:
+                    if k > 0:
+                        last_position = tuple(x - o for x, o in zip(last_position, offsets[k]))
+                    # if the creature jump, then the result is invalid. limit is defined arbitrarily
+                    if last_position[2] > 12.5:
+                        reasons[k] = "jump"
+                    # if the creature fall below the ground, then the result is invalid
+                    elif last_position[2] < 0:
+                        reasons[k] = "fall"
+
+                if reasons[k] != "complete":
+                    last_positions[k] = (0, 0, 0)
+                    frames[k] = i + 1
+                    self.remove_robot(robots[k], active, k)
+                    continue
+                last_positions[k] = last_position
+
+                # early stopping keeps the position reached so far
+                if check:
+                    velocity = None
+                    if policy.still_speed is not None:
+                        velocity, _ = p.getBaseVelocity(robots[k], physicsClientId = client_id)
+                    stop_reason = policies[k].check(i + 1, max_frame, last_position, velocity)
+                    if stop_reason is not None:
+                        reasons[k] = stop_reason
+                        frames[k] = i + 1
+                        self.remove_robot(robots[k], active, k)
+
+            if len(active) == 0:
                 break
-            finally:
-                # if the creature jump, then the result is invalid. limit is defined arbitrarily
-                if last_position[2] > 12.5:
-                    last_position = (0, 0, 0)
-                    break
-                # if the creature fall below the ground, then the result is invalid
-                if last_position[2] < 0:
-                    last_position = (0, 0, 0)
-                    break
-
-        cr.update_position(last_position)
+
+        results = []
+        for cr, last_position, frame, reason in zip(creatures, last_positions, frames, reasons):
+            cr.update_position(last_position)
+            results.append(RunResult(last_position, frame, reason))
+        return results
+
+    def load_robots(self, creatures:list[creature.Creature], filename:str = "robot.urdf", dirname = ".urdf/"):
+        client_id = self.client_id
+        if self.world_mode == "reset" or self.world_state is None:
+            p.resetSimulation(physicsClientId = client_id)
+            p.setPhysicsEngineParameter(enableFileCaching = 0, physicsClientId = client_id)
+            p.setGravity(0, 0, -10, physicsClientId = client_id)
+
+            plane_shape = p.createCollisionShape(p.GEOM_PLANE, physicsClientId = client_id)
+            self.plane = p.createMultiBody(plane_shape, plane_shape, physicsClientId = client_id)
+            if self.world_mode == "persistent":
+                self.world_state = p.saveState(physicsClientId = client_id)
+        else:
+            # "persistent" mode: the plane and engine settings stay, the last
+            # robots are removed and the world is put back to the saved state
+            for robot in self.robots:
+                p.removeBody(robot, physicsClientId = client_id)
+            p.restoreState(stateId = self.world_state, physicsClientId = client_id)
+
+        # each URDF is loaded as soon as it is written, so one file serves all
+        self.robots = []
+        for cr in creatures:
+            cr_xml_path = self.write_xml(cr, filename, dirname)
+            self.robots.append(p.loadURDF(cr_xml_path, physicsClientId = client_id))
+        return list(self.robots)
+
+    def remove_robot(self, robot:int, active:list[int], k:int):
+        # a finished creature leaves the world so it does not slow the others
+        # down; a lone creature is left for `load_robots` to clear
+        active.remove(k)
+        if len(self.robots) > 1:
+            p.removeBody(robot, physicsClientId = self.client_id)
+            self.robots.remove(robot)
+
+    def filter_collisions(self, robots:list[int]):
+        # creature k is in group bit k + 1 and only collides with the plane,
+        # which is in group bit 0 and collides with everything
+        client_id = self.client_id
+        p.setCollisionFilterGroupMask(self.plane, -1, 1, -1, physicsClientId = client_id)
+        for k, robot in enumerate(robots):
+            group = 1 << (k + 1)
+            for link in range(-1, p.getNumJoints(robot, physicsClientId = client_id)):
+                p.setCollisionFilterGroupMask(robot, link, group, group | 1, physicsClientId = client_id)
 
     def eval_population(self, pop:population.Population, max_frame:int = 2400, dirname = ".urdf/"):
-        if not os.path.exists(dirname):
+        if self.urdf_mode == "file" and not os.path.exists(dirname):
             os.makedirs(dirname)
-        for cr in pop.creatures:
-            self.run_creature(cr, max_frame = max_frame, dirname = dirname)
+        # creatures that are not in the cache are simulated `batch_size` at a time
+        results = [None] * len(pop.creatures)
+        keys = [None] * len(pop.creatures)
+        simulated = []
+        batch = []
+        for i, cr in enumerate(pop.creatures):
+            cr.reset_motors()
+            if self.cache is not None:
+                keys[i] = FitnessCache.get_key(cr.dna, max_frame, self.get_params())
+                results[i] = self.cache.get(keys[i])
+                if results[i] is not None:
+                    cr.update_position(results[i].last_position)
+                    continue
+            simulated.append(i)
+            batch.append(i)
+            if len(batch) == self.batch_size or i == len(pop.creatures) - 1:
+                self.__run_batch(pop, batch, results, keys, max_frame, dirname)
+                batch = []
+        self.__run_batch(pop, batch, results, keys, max_frame, dirname)
+        self.results = results
+        self.simulated = simulated
+
+    def __run_batch(self, pop:population.Population, batch:list[int], results:list, keys:list, max_frame:int, dirname):
+        if len(batch) == 0:
+            return
+        batch_results = self.run_creatures([pop.creatures[i] for i in batch], max_frame = max_frame, dirname = dirname)
+        for i, result in zip(batch, batch_results):
+            results[i] = result
+            if self.cache is not None and Simulator.is_cacheable(result):
+                self.cache.put(keys[i], result)
+
+    def get_params(self):
+        # simulator settings that change the outcome of a run, part of the cache key
+        params = (self.sample_every, self.batch_size)
+        return params if self.policy is None else params + self.policy.get_params()
+
+    @staticmethod
+    def get_urdf_modes():
+        return ("file", "memory")
+
+    @staticmethod
+    def supports_memory_urdf():
+        return hasattr(os, "memfd_create") and os.path.isdir("/proc/self/fd")
+
+    @staticmethod
+    def get_world_modes():
+        return ("reset", "persistent")
+
+    @staticmethod
+    def get_max_batch_size():
+        # one collision group bit per creature, next to the plane's
+        return 30
+
+    @staticmethod
+    def is_cacheable(result:RunResult):
+        # runs cut by the elite distance bound depend on the generation
+        return result.reason != "hopeless"
         
 class MultiSimulator():
-    def __init__(self, pool_size:int = 5):
-        self.sims = [Simulator(i) for i in range(pool_size)]
+    # takes the settings of `Simulator`, with the same caveat on `batch_size`
+    def __init__(self, pool_size:int = 5, urdf_mode:str = "file", cache_size:int = 0, policy:StoppingPolicy = None, sample_every:int = 1,
+                 world_mode:str = "reset", batch_size:int = 1, spacing:float = 20):
+        if urdf_mode not in Simulator.get_urdf_modes():
+            raise Exception(f"Invalid URDF mode: {urdf_mode}")
+        if world_mode not in Simulator.get_world_modes():
+            raise Exception(f"Invalid world mode: {world_mode}")
+        if sample_every < 1:
+            raise Exception(f"Invalid sampling stride: {sample_every}")
+        if batch_size < 1 or batch_size > Simulator.get_max_batch_size():
+            raise Exception(f"Invalid batch size: {batch_size}")
+        if batch_size > 1 and cache_size > 0:
+            raise Exception("A fitness cache cannot be used with batches of more than one creature.")
+        if urdf_mode == "memory" and not Simulator.supports_memory_urdf():
+            raise Exception("URDF mode memory needs os.memfd_create and /proc, which only Linux provides.")
+        self.urdf_mode = urdf_mode
+        self.world_mode = world_mode
+        self.policy = policy
+        self.sample_every = sample_every
+        self.batch_size = batch_size
+        self.cache = FitnessCache(cache_size) if cache_size > 0 else None
+        self.results = []
+        # indices of the creatures simulated rather than read from the cache
+        self.simulated = []
+        # long-lived workers, each owning its own physics client, pull
+        # batches of creatures from a shared queue until they receive a `None` task
+        self.task_queue = Queue()
+        self.result_queue = Queue()
+        # workers attaching to an arena register it with the resource tracker;
+        # started before a tracker exists, each would run its own and unlink
+        # the population's arenas when it exits, so they share ours instead
+        resource_tracker.ensure_running()
+        self.workers = []
+        for sim_id in range(pool_size):
+            worker = Process(target = MultiSimulator.static_worker,
+                             args = (sim_id, urdf_mode, sample_every, world_mode, batch_size, spacing,
+                                     self.task_queue, self.result_queue),
+                             daemon = True)
+            worker.start()
+            self.workers.append(worker)
+        self.busy_time = np.zeros(pool_size)
+        self.wall_time = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def close(self, timeout:float = 5):
+        if len(self.workers) == 0:
+            return
+        for worker in self.workers:
+            if worker.is_alive():
+                self.task_queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        self.workers = []
+        self.task_queue.close()
+        self.result_queue.close()
 
     def eval_population(self, pop:population.Population, max_frame:int = 2400, dirname = ".urdf/"):
-        for cr in pop.creatures:
-            cr.reset_motors()
-        
-        if not os.path.exists(dirname):
+        if len(self.workers) == 0:
+            raise Exception("MultiSimulator has been closed.")
+
+        if self.urdf_mode == "file" and not os.path.exists(dirname):
             os.makedirs(dirname)
-        sim_id = 0
-        pool_size = len(self.sims)
-        population_size = len(pop.creatures)
-        pool_argset = []
-        new_creatures = []
 
-        # print(f"iterating for {population_size} creatures with pool size of {pool_size}")
+        # only creatures that are not in the cache are sent to the workers
+        results = [None] * len(pop.creatures)
+        keys = [None] * len(pop.creatures)
+        indices = []
         for i, cr in enumerate(pop.creatures):
-            # print(sim_id, end=" ")
-            pool_argset.append([self.sims[sim_id], cr, max_frame, dirname])
-            sim_id += 1
-            if sim_id >= pool_size or (i + 1) == population_size:
-                with Pool(pool_size) as pool:
-                    creatures = pool.starmap(MultiSimulator.static_run_creature, pool_argset)
-                    new_creatures.extend(creatures)
-                pool.close()
-                pool_argset = []
-                sim_id = 0
-                # print()
-
-        pop.reset_population(new_creatures)
+            if self.cache is not None:
+                keys[i] = FitnessCache.get_key(cr.dna, max_frame, self.get_params())
+                results[i] = self.cache.get(keys[i])
+                if results[i] is not None:
+                    continue
+            indices.append(i)
+
+        # dispatch the most expensive creatures first so that the cheap ones
+        # fill the gaps at the end instead of leaving workers idle; creatures
+        # of similar cost share a batch, workers read the DNA from the shared
+        # arena and send back a `RunResult` per creature
+        arena = pop.sync_arena()
+        costs = [MultiSimulator.estimate_cost(pop.creatures[i], max_frame) for i in indices]
+        order = [indices[j] for j in np.argsort(costs, kind = "stable")[::-1]]
+        batches = [order[j:j + self.batch_size] for j in range(0, len(order), self.batch_size)]
+        start_time = time.perf_counter()
+        for batch in batches:
+            self.task_queue.put((batch, arena.name, max_frame, dirname, self.policy))
+
+        errors = []
+        self.busy_time = np.zeros(len(self.workers))
+        for _ in range(len(batches)):
+            batch, batch_results, sim_id, busy_time = self.__get_result()
+            self.busy_time[sim_id] += busy_time
+            if isinstance(batch_results, Exception):
+                errors.append(batch_results)
+                continue
+            for i, result in zip(batch, batch_results):
+                results[i] = result
+                if self.cache is not None and Simulator.is_cacheable(result):
+                    self.cache.put(keys[i], result)
+        self.wall_time = time.perf_counter() - start_time
+
+        if len(errors) > 0:
+            raise errors[0]
+
+        for cr, result in zip(pop.creatures, results):
+            cr.reset_motors()
+            cr.update_position(result.last_position)
+        self.results = results
+        self.simulated = indices
+
+    def get_params(self):
+        params = (self.sample_every, self.batch_size)
+        return params if self.policy is None else params + self.policy.get_params()
+
+    def get_utilisation(self):
+        # fraction of the last `eval_population` wall time each worker spent simulating
+        if self.wall_time == 0:
+            return np.zeros(len(self.busy_time))
+        return self.busy_time / self.wall_time
+
+    def __get_result(self):
+        while True:
+            try:
+                return self.result_queue.get(timeout = 1)
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in self.workers):
+                    raise Exception("A simulator worker has terminated unexpectedly.")
+
+    @staticmethod
+    def static_worker(sim_id:int, urdf_mode:str, sample_every:int, world_mode:str, batch_size:int, spacing:float,
+                      task_queue:Queue, result_queue:Queue):
+        sim = Simulator(sim_id, urdf_mode, sample_every = sample_every, world_mode = world_mode,
+                        batch_size = batch_size, spacing = spacing)
+        arenas = {}
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            # the policy travels with the task as its elite distance changes per generation
+            batch, arena_name, max_frame, dirname, sim.policy = task
+            start_time = time.perf_counter()
+            try:
+                # populations swap between two arenas, so the last two stay attached
+                if arena_name not in arenas:
+                    if len(arenas) >= 2:
+                        del arenas[next(iter(arenas))]
+                    arenas[arena_name] = DNAArena.attach(arena_name)
+                creatures = []
+                for i in batch:
+                    cr = creature.Creature(1)
+                    cr.update_dna(arenas[arena_name].read(i))
+                    creatures.append(cr)
+                results = MultiSimulator.static_run_creatures(sim, creatures, max_frame, dirname)
+            except Exception as e:
+                results = e
+            result_queue.put((batch, results, sim_id, time.perf_counter() - start_time))
+        sim.close()
+
+    @staticmethod
+    def estimate_cost(cr:creature.Creature, max_frame:int = 2400):
+        return cr.get_link_stats()["n_exp_links"] * max_frame
 
     @staticmethod
-    def static_run_creature(sim:Simulator, cr:creature.Creature, max_frame:int = 2400, dirname = ".urdf/"):
-        sim.run_creature(cr, max_frame = max_frame, dirname = dirname)
-        return cr
\ No newline at end of file
+    def static_run_creatures(sim:Simulator, creatures:list[creature.Creature], max_frame:int = 2400, dirname = ".urdf/"):
+        return sim.run_creatures(creatures, max_frame = max_frame, dirname = dirname)
\ No newline at end of file
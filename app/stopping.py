@@ -0,0 +1,93 @@
+import numpy as np
+from collections import deque
+
+class StoppingPolicy:
+    # Reasons a run can end early. The creature keeps the position it had at
+    # that frame, so such runs stay valid, unlike "error", "jump" and "fall".
+    #   still    : base speed below `still_speed` for `still_checks` checks in a row
+    #   settled  : base moved less than `settle_distance` over `settle_frames`
+    #   hopeless : even at `max_speed` it cannot pass `elite_distance` in the
+    #              frames that are left
+    def __init__(self,
+                 check_every:int = 60,
+                 min_frame:int = 240,
+                 still_speed:float = None,
+                 still_checks:int = 4,
+                 settle_distance:float = None,
+                 settle_frames:int = 480,
+                 max_speed:float = None,
+                 elite_distance:float = 0,
+                 time_step:float = 1 / 240):
+        assert 0 < check_every and 0 <= min_frame
+        assert 0 < still_checks and 0 < settle_frames
+        self.check_every = check_every
+        self.min_frame = min_frame
+        self.still_speed = still_speed
+        self.still_checks = still_checks
+        self.settle_distance = settle_distance
+        self.settle_frames = settle_frames
+        self.max_speed = max_speed
+        self.elite_distance = elite_distance
+        self.time_step = time_step
+        self.reset()
+
+    def __repr__(self):
+        return (f"StoppingPolicy(check_every={self.check_every}, min_frame={self.min_frame}, "
+                f"still_speed={self.still_speed}, still_checks={self.still_checks}, "
+                f"settle_distance={self.settle_distance}, settle_frames={self.settle_frames}, "
+                f"max_speed={self.max_speed}, elite_distance={self.elite_distance})")
+
+    def reset(self):
+        self.still_count = 0
+        self.positions = deque(maxlen = self.settle_frames // self.check_every + 1)
+
+    def check(self, frame:int, max_frame:int, position:tuple, velocity:tuple = None):
+        # `frame` is the number of frames stepped so far; returns the reason
+        # to stop or None
+        if self.still_speed is not None:
+            if np.linalg.norm(velocity) < self.still_speed:
+                self.still_count += 1
+            else:
+                self.still_count = 0
+
+        if self.settle_distance is not None:
+            self.positions.append(position)
+
+        if frame < self.min_frame:
+            return None
+
+        if self.still_speed is not None and self.still_count >= self.still_checks:
+            return "still"
+
+        if (self.settle_distance is not None
+            and (len(self.positions) - 1) * self.check_every >= self.settle_frames
+            and np.linalg.norm(np.subtract(position, self.positions[0])) < self.settle_distance):
+            return "settled"
+
+        if self.max_speed is not None:
+            reach = self.max_speed * (max_frame - frame) * self.time_step
+            if np.linalg.norm(position) + reach < self.elite_distance:
+                return "hopeless"
+
+        return None
+
+    def get_params(self):
+        # everything but the elite distance, which changes between generations;
+        # "hopeless" results depend on it and are not cached
+        return (self.check_every, self.min_frame, self.still_speed, self.still_checks,
+                self.settle_distance, self.settle_frames, self.max_speed, self.time_step)
+
+    @staticmethod
+    def get_reasons():
+        return ("still", "settled", "hopeless")
+
+    @staticmethod
+    def summarise(results:list, max_frame:int):
+        # number of runs per reason and the frames early stopping saved
+        reasons = {}
+        saved_frames = 0
+        for result in results:
+            reasons[result.reason] = reasons.get(result.reason, 0) + 1
+            if result.reason in StoppingPolicy.get_reasons():
+                saved_frames += max_frame - result.frames
+        return reasons, saved_frames
@@ -0,0 +1,141 @@
+import numpy as np
+from creatures import creature
+
+
+class SurrogateModel:
+    # predicts the distance of a creature from its genome, so that more
+    # children can be bred than simulated: the `oversample` times as many
+    # candidates are ranked, the best predicted are simulated and an
+    # `exploration` share of the slots goes to candidates drawn at random,
+    # which keeps the model from only ever seeing what it already likes.
+    #   ridge : ridge regression with penalty `alpha` on standardised features
+    #   knn   : mean distance of the `k` nearest creatures seen
+    # Screening starts once `min_samples` simulated creatures have been seen;
+    # only the last `window` of them are kept for training
+    def __init__(self,
+                 model:str = "ridge",
+                 oversample:float = 2.0,
+                 exploration:float = 0.25,
+                 alpha:float = 1.0,
+                 k:int = 8,
+                 window:int = 2048,
+                 min_samples:int = 256):
+        if model not in SurrogateModel.get_models():
+            raise Exception(f"Surrogate model must be one of {SurrogateModel.get_models()}.")
+        assert 1 <= oversample
+        assert 0 <= exploration and exploration <= 1
+        assert 0 <= alpha and 0 < k
+        assert 0 < min_samples and min_samples <= window
+        self.model = model
+        self.oversample = oversample
+        self.exploration = exploration
+        self.alpha = alpha
+        self.k = k
+        self.window = window
+        self.min_samples = min_samples
+
+        self.features = None
+        self.targets = np.zeros(0)
+        self.mean = None
+        self.scale = None
+        self.weights = None
+        # predicted distances of the selected children, in selection order
+        self.pending = None
+        # statistics of the last generation; candidates bred but never simulated
+        self.n_screened_out = 0
+        self.correlation = np.nan
+        self.error = np.nan
+
+    def __repr__(self):
+        return (f"SurrogateModel(model={self.model}, oversample={self.oversample}, "
+                f"exploration={self.exploration}, alpha={self.alpha}, k={self.k}, "
+                f"window={self.window}, min_samples={self.min_samples})")
+
+    def is_ready(self):
+        return len(self.targets) >= self.min_samples
+
+    def get_num_candidates(self, num_of_children:int):
+        if not self.is_ready():
+            return num_of_children
+        return int(np.ceil(num_of_children * self.oversample))
+
+    def select(self, children:np.ndarray, lengths:np.ndarray, num_of_children:int, rng:np.random.Generator = None):
+        # indices of the candidates to simulate, best predicted first, then the
+        # explored ones
+        rng = np.random.default_rng() if rng is None else rng
+        num_of_candidates = len(lengths)
+        self.n_screened_out = max(num_of_candidates - num_of_children, 0)
+        if not self.is_ready() or num_of_candidates <= num_of_children:
+            self.pending = None
+            return np.arange(min(num_of_children, num_of_candidates))
+
+        predictions = self.predict(children, lengths)
+        num_of_explored = int(round(num_of_children * self.exploration))
+        ranked = np.argsort(-predictions, kind = "stable")
+        best = ranked[:num_of_children - num_of_explored]
+        explored = rng.choice(ranked[len(best):], num_of_explored, replace = False)
+        selected = np.concatenate((best, explored)).astype(int)
+        self.pending = predictions[selected]
+        return selected
+
+    def score(self, distances:np.ndarray, children:np.ndarray = None):
+        # compares the predictions made by `select` with the distances the
+        # simulated children reached; the children come first in the
+        # population, `children` are the indices of those still there
+        self.correlation = np.nan
+        self.error = np.nan
+        if self.pending is None:
+            return
+        children = np.arange(len(self.pending)) if children is None else np.asarray(children, dtype = int)
+        predictions = self.pending[children]
+        distances = np.asarray(distances, dtype = np.float64)[:len(predictions)]
+        self.pending = None
+        if len(predictions) == 0:
+            return
+        self.error = float(np.mean(np.abs(predictions - distances)))
+        if np.std(predictions) > 0 and np.std(distances) > 0:
+            self.correlation = float(np.corrcoef(predictions, distances)[0, 1])
+
+    def update(self, dna:np.ndarray, lengths:np.ndarray, distances:np.ndarray):
+        # adds simulated creatures and fits the model again on the window
+        features = SurrogateModel.get_features(dna, lengths)
+        self.features = features if self.features is None else np.concatenate((self.features, features))[-self.window:]
+        self.targets = np.concatenate((self.targets, np.asarray(distances, dtype = np.float64)))[-self.window:]
+
+        self.mean = self.features.mean(axis = 0)
+        self.scale = self.features.std(axis = 0)
+        self.scale[self.scale == 0] = 1
+        if self.model == "ridge":
+            x = (self.features - self.mean) / self.scale
+            y = self.targets - self.targets.mean()
+            self.weights = np.linalg.solve(x.T @ x + self.alpha * np.eye(x.shape[1]), x.T @ y)
+
+    def predict(self, dna:np.ndarray, lengths:np.ndarray):
+        x = (SurrogateModel.get_features(dna, lengths) - self.mean) / self.scale
+        if self.model == "ridge":
+            return x @ self.weights + self.targets.mean()
+        seen = (self.features - self.mean) / self.scale
+        sq_dists = (x ** 2).sum(axis = 1)[:, None] - 2 * x @ seen.T + (seen ** 2).sum(axis = 1)[None, :]
+        k = min(self.k, len(seen))
+        nearest = np.argpartition(sq_dists, k - 1, axis = 1)[:, :k]
+        return self.targets[nearest].mean(axis = 1)
+
+    @staticmethod
+    def get_models():
+        return ("ridge", "knn")
+
+    @staticmethod
+    def get_features(dna:np.ndarray, lengths:np.ndarray):
+        # body statistics plus the mean of every gene, from a padded batch
+        lengths = np.asarray(lengths)
+        stats = creature.Creature.compute_link_stats(dna, lengths)
+        valid = (np.arange(dna.shape[1])[None, :] < lengths[:, None])[..., None]
+        gene_means = (dna * valid).sum(axis = 1) / np.maximum(lengths, 1)[:, None]
+        return np.column_stack((
+            np.log1p(stats["n_exp_links"]),
+            stats["depth"],
+            stats["max_fanout"],
+            np.log1p(stats["mass"]),
+            lengths,
+            gene_means
+        )).astype(np.float64)
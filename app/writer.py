@@ -0,0 +1,64 @@
+import queue
+import atexit
+import threading
+
+
+class AsyncWriter:
+    # runs disk writes on a background thread in the order they were
+    # submitted; `submit` blocks while `max_pending` writes are waiting, so a
+    # slow disk holds the evolution back instead of piling up snapshots
+    def __init__(self, max_pending:int = 4):
+        assert 0 < max_pending
+        self.max_pending = max_pending
+        self.tasks = queue.Queue(maxsize = max_pending)
+        self.errors = []
+        self.thread = threading.Thread(target = self.__work, daemon = True)
+        self.thread.start()
+        # pending writes are finished even if the owner is never closed
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, fn, *args, **kwargs):
+        if self.thread is None:
+            raise Exception("AsyncWriter has been closed.")
+        self.__raise_errors()
+        self.tasks.put((fn, args, kwargs))
+
+    def flush(self):
+        # wait for every submitted write
+        if self.thread is not None:
+            self.tasks.join()
+        self.__raise_errors()
+
+    def close(self):
+        if self.thread is None:
+            return
+        self.tasks.put(None)
+        self.thread.join()
+        self.thread = None
+        atexit.unregister(self.close)
+        self.__raise_errors()
+
+    def __work(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                self.tasks.task_done()
+                break
+            fn, args, kwargs = task
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                self.errors.append(e)
+            self.tasks.task_done()
+
+    def __raise_errors(self):
+        if len(self.errors) > 0:
+            error = self.errors[0]
+            self.errors = []
+            raise error
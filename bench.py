@@ -0,0 +1,13 @@
+from bench.bench_creature import *
+from bench.bench_population import *
+from bench.bench_simulator import *
+
+bench_urdf()
+bench_footprint()
+bench_new_generation()
+bench_batch_mating()
+bench_link_stats()
+bench_scheduler()
+bench_ipc()
+bench_sampling()
+bench_batching()
@@ -0,0 +1,54 @@
+import pickle
+import timeit
+import tracemalloc
+import numpy as np
+from creatures import creature
+
+GENE_COUNT = 20
+REPEAT     = 20
+POP_SIZE   = 120
+
+
+def large_creature(gene_count:int = GENE_COUNT, max_links:int = 400, rng:np.random.Generator = None):
+    # keep drawing until the body is large, but not absurdly so
+    while True:
+        cr = creature.Creature(gene_count, rng)
+        if 50 <= len(cr.get_expanded_links()) <= max_links:
+            return cr
+
+
+def bench_urdf():
+    cr = large_creature()
+
+    minidom_time = timeit.timeit(lambda: cr.get_xml().toprettyxml(), number = REPEAT) / REPEAT
+    pretty_time  = timeit.timeit(lambda: cr.get_urdf(), number = REPEAT) / REPEAT
+    compact_time = timeit.timeit(lambda: cr.get_urdf(pretty = False), number = REPEAT) / REPEAT
+
+    print(f"URDF serialisation ({len(cr.get_expanded_links())} links)")
+    print(f"  minidom toprettyxml : {minidom_time * 1000:.2f}ms")
+    print(f"  template (pretty)   : {pretty_time * 1000:.2f}ms ({minidom_time / pretty_time:.1f}x)")
+    print(f"  template (compact)  : {compact_time * 1000:.2f}ms ({minidom_time / compact_time:.1f}x)")
+
+
+
+def bench_footprint():
+    rng = np.random.default_rng(0)
+    tracemalloc.start()
+    creatures = [large_creature(max_links = 200, rng = rng) for _ in range(POP_SIZE)]
+    for cr in creatures:
+        cr.get_expanded_links()
+        cr.get_motors()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    n_links = sum(len(cr.get_expanded_links()) for cr in creatures)
+    pickle_size = sum(len(pickle.dumps(cr)) for cr in creatures)
+
+    print(f"Population footprint ({POP_SIZE} creatures, {GENE_COUNT} genes, {n_links} expanded links)")
+    print(f"  memory      : {memory / 2 ** 20:.2f}MiB")
+    print(f"  pickle size : {pickle_size / 2 ** 20:.2f}MiB")
+
+
+if __name__ == "__main__":
+    bench_urdf()
+    bench_footprint()
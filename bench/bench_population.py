@@ -0,0 +1,65 @@
+import time
+import numpy as np
+from creatures import creature, population, evolution
+
+POP_SIZES = (50, 100, 200, 400, 800)
+REPEAT    = 3
+
+
+def random_population(pop_size:int):
+    pop = population.Population(pop_size, 3)
+    for cr in pop.creatures:
+        cr.update_position(tuple(np.random.normal(size = 3)))
+    return pop
+
+
+def bench_new_generation():
+    print("Generation building (new_generation)")
+    for pop_size in POP_SIZES:
+        times = []
+        for _ in range(REPEAT):
+            pop = random_population(pop_size)
+            start_time = time.perf_counter()
+            pop.new_generation(num_of_elites = pop_size // 10, num_of_random = 0, max_length = 10)
+            times.append(time.perf_counter() - start_time)
+        elapsed = np.median(times)
+        print(f"  {pop_size:5d} creatures: {elapsed * 1000:8.1f}ms ({elapsed / pop_size * 1e6:.0f}us per creature)")
+
+
+def bench_batch_mating():
+    print("Mating a generation (Mating.mate per child vs BatchMating.mate)")
+    for pop_size in POP_SIZES:
+        pop = random_population(pop_size)
+        arena = pop.sync_arena()
+        pairs = np.random.randint(pop_size, size = (pop_size, 2))
+        args = (2, 10, 1.2, 0.1, 0.1)
+
+        start_time = time.perf_counter()
+        for p1, p2 in pairs:
+            evolution.Mating.mate(pop.creatures[p1].dna, pop.creatures[p2].dna, *args)
+        per_child = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        evolution.BatchMating.mate(arena.dna, arena.lengths, pairs[:, 0], pairs[:, 1], *args)
+        batched = time.perf_counter() - start_time
+        print(f"  {pop_size:5d} children: {per_child * 1000:8.1f}ms per child, {batched * 1000:8.1f}ms batched ({per_child / batched:.1f}x)")
+
+
+def bench_link_stats():
+    print("Expanded link counts (expanding links vs Creature.compute_population_stats)")
+    for pop_size in POP_SIZES:
+        creatures = population.Population(pop_size, 8).creatures
+        start_time = time.perf_counter()
+        [len(cr.get_expanded_links()) for cr in creatures]
+        expanded = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        creature.Creature.compute_population_stats(creatures)
+        batched = time.perf_counter() - start_time
+        print(f"  {pop_size:5d} creatures: {expanded * 1000:8.1f}ms expanded, {batched * 1000:8.1f}ms batched ({expanded / batched:.1f}x)")
+
+
+if __name__ == "__main__":
+    bench_new_generation()
+    bench_batch_mating()
+    bench_link_stats()
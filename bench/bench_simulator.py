@@ -0,0 +1,105 @@
+import time
+import pickle
+import numpy as np
+from app import simulator
+from creatures import population
+
+POP_SIZE  = 40
+POOL_SIZE = 4
+MAX_FRAME = 1200
+STRIDES   = (1, 10, 60)
+BATCHES   = (1, 4, 10)
+
+
+def mixed_population(pop_size:int = POP_SIZE, rng:np.random.Generator = None):
+    # half small and half large bodies, so that evaluation costs differ widely
+    pop = population.Population(pop_size, 2, rng)
+    large = population.Population(pop_size // 2, 8, rng)
+    pop.reset_population(pop.creatures[:pop_size - pop_size // 2] + large.creatures)
+    return pop
+
+
+def bench_scheduler():
+    pop = mixed_population()
+
+    with simulator.MultiSimulator(POOL_SIZE) as sim:
+        # static chunking: every chunk waits for its slowest creature
+        creatures = pop.creatures
+        start_time = time.perf_counter()
+        for i in range(0, len(creatures), POOL_SIZE):
+            chunk = population.Population(1)
+            chunk.reset_population(creatures[i:i + POOL_SIZE])
+            sim.eval_population(chunk, MAX_FRAME)
+        chunked_time = time.perf_counter() - start_time
+
+        # dynamic dispatch, longest expected first
+        start_time = time.perf_counter()
+        sim.eval_population(pop, MAX_FRAME)
+        dynamic_time = time.perf_counter() - start_time
+        utilisation = sim.get_utilisation()
+
+    print(f"Scheduler ({POP_SIZE} creatures, {POOL_SIZE} workers, {MAX_FRAME} frames)")
+    print(f"  static chunks   : {chunked_time:.2f}s")
+    print(f"  dynamic dispatch: {dynamic_time:.2f}s")
+    print(f"  utilisation     : {' '.join(f'{u:.2f}' for u in utilisation)} (mean {np.mean(utilisation):.2f})")
+
+
+
+def bench_ipc():
+    pop = mixed_population(120)
+    with simulator.MultiSimulator(POOL_SIZE) as sim:
+        sim.eval_population(pop, 240)
+        results = sim.results
+
+    # old protocol: the whole creature is sent to the worker and back
+    creature_bytes = sum(2 * len(pickle.dumps((i, cr, MAX_FRAME, ".urdf/"))) for i, cr in enumerate(pop.creatures))
+    # previous protocol: DNA out, `RunResult` back
+    record_bytes = sum(len(pickle.dumps((i, cr.dna, MAX_FRAME, ".urdf/"))) +
+                       len(pickle.dumps((i, result, 0, 0.0)))
+                       for i, (cr, result) in enumerate(zip(pop.creatures, results)))
+    # current protocol: arena slot out, `RunResult` back
+    arena_name = pop.sync_arena().name
+    slot_bytes = sum(len(pickle.dumps(([i], arena_name, MAX_FRAME, ".urdf/"))) +
+                     len(pickle.dumps(([i], [result], 0, 0.0)))
+                     for i, result in enumerate(results))
+
+    print(f"IPC per generation ({len(pop.creatures)} creatures)")
+    print(f"  whole creatures : {creature_bytes / 1024:.1f}KiB")
+    print(f"  dna and results : {record_bytes / 1024:.1f}KiB")
+    print(f"  arena slots     : {slot_bytes / 1024:.1f}KiB")
+
+
+def bench_sampling():
+    pop = mixed_population(20, np.random.default_rng(0))
+
+    print(f"Position sampling ({len(pop.creatures)} creatures, {MAX_FRAME} frames)")
+    for sample_every in STRIDES:
+        with simulator.Simulator(sample_every = sample_every) as sim:
+            for cr in pop.creatures:
+                cr.reset_motors()
+            start_time = time.perf_counter()
+            sim.eval_population(pop, MAX_FRAME)
+            elapsed = time.perf_counter() - start_time
+            frames = sum(result.frames for result in sim.results)
+            invalid = sum(result.reason != "complete" for result in sim.results)
+        print(f"  stride {sample_every:3d}: {frames / elapsed:9.0f} frames/s ({invalid} invalid runs)")
+
+
+def bench_batching():
+    pop = mixed_population(20, np.random.default_rng(0))
+
+    print(f"In-world batching ({len(pop.creatures)} creatures, {MAX_FRAME} frames)")
+    for batch_size in BATCHES:
+        with simulator.Simulator(batch_size = batch_size) as sim:
+            start_time = time.perf_counter()
+            sim.eval_population(pop, MAX_FRAME)
+            elapsed = time.perf_counter() - start_time
+            frames = sum(result.frames for result in sim.results)
+        print(f"  batch {batch_size:3d}: {elapsed:6.2f}s ({frames / elapsed:9.0f} creature frames/s)")
+
+
+if __name__ == "__main__":
+    bench_scheduler()
+    bench_ipc()
+    bench_sampling()
+    bench_batching()
@@ -0,0 +1,91 @@
+import weakref
+import numpy as np
+from multiprocessing import shared_memory
+
+
+class SharedBuffer:
+    # a shared memory segment seen by numpy as one byte array. Arrays taken
+    # from it keep this object alive instead of exporting the memory buffer,
+    # so the segment can be closed once the last array is gone and never
+    # while one still reads it
+    def __init__(self, name:str = None, create:bool = False, size:int = 0):
+        self.shm = shared_memory.SharedMemory(name = name, create = create, size = size)
+        self.name = self.shm.name
+        probe = np.frombuffer(self.shm.buf, dtype = np.uint8)
+        self.__array_interface__ = {"shape": (self.shm.size,), "typestr": "|u1",
+                                    "data": (probe.ctypes.data, False), "version": 3}
+        # release the export, or `close` would fail
+        del probe
+
+
+class DNAArena:
+    # layout: header (capacity, max_length, gene_size), length vector, then
+    # every genome padded to `max_length` rows
+    __header_size = 3
+
+    def __init__(self, capacity:int, max_length:int, gene_size:int, name:str = None):
+        assert 0 < capacity and 0 < max_length and 0 < gene_size
+        create = name is None
+        nbytes = DNAArena.get_nbytes(capacity, max_length, gene_size)
+        self.buffer = SharedBuffer(name = name, create = create, size = nbytes if create else 0)
+        self.name = self.buffer.name
+        self.capacity = capacity
+        self.max_length = max_length
+        self.gene_size = gene_size
+
+        raw = np.asarray(self.buffer)
+        offset = 0
+        self.header = np.ndarray((DNAArena.__header_size,), dtype = np.int64, buffer = raw, offset = offset)
+        offset += self.header.nbytes
+        self.lengths = np.ndarray((capacity,), dtype = np.int64, buffer = raw, offset = offset)
+        offset += self.lengths.nbytes
+        self.dna = np.ndarray((capacity, max_length, gene_size), dtype = np.float64, buffer = raw, offset = offset)
+
+        if create:
+            self.header[:] = (capacity, max_length, gene_size)
+            self.lengths[:] = 0
+        # the segment is closed, and removed by its creator, once neither the
+        # arena nor any genome view of it is left
+        self.__finalizer = weakref.finalize(self.buffer, DNAArena.release, self.buffer.shm, create)
+
+    def __len__(self):
+        return self.capacity
+
+    def write(self, index:int, dna:np.ndarray):
+        length = len(dna)
+        assert length <= self.max_length and dna.shape[-1] == self.gene_size
+        self.dna[index, :length] = dna
+        self.dna[index, length:] = 0
+        self.lengths[index] = length
+        return self.dna[index, :length]
+
+    def read(self, index:int):
+        return self.dna[index, :self.lengths[index]]
+
+    def holds(self, index:int, dna:np.ndarray):
+        # true when `dna` already is the view returned for this slot
+        return (index < self.capacity
+                and len(dna) == self.lengths[index]
+                and dna.dtype == self.dna.dtype
+                and dna.ctypes.data == self.dna[index].ctypes.data
+                and dna.strides == self.dna[index].strides)
+
+    def fits(self, capacity:int, max_length:int):
+        return capacity <= self.capacity and max_length <= self.max_length
+
+    @staticmethod
+    def attach(name:str):
+        shm = shared_memory.SharedMemory(name = name)
+        capacity, max_length, gene_size = np.frombuffer(shm.buf, dtype = np.int64, count = DNAArena.__header_size).tolist()
+        shm.close()
+        return DNAArena(capacity, max_length, gene_size, name)
+
+    @staticmethod
+    def release(shm:shared_memory.SharedMemory, unlink:bool):
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+    @staticmethod
+    def get_nbytes(capacity:int, max_length:int, gene_size:int):
+        return 8 * (DNAArena.__header_size + capacity + capacity * max_length * gene_size)
@@ -1,10 +1,10 @@
-import copy
 import numpy as np
 from creatures import genome, phenotype
 from xml.dom.minidom import getDOMImplementation
 
 
 class CreatureLink:
+    __slots__ = ("name", "parent_name", "g_dict", "recur")
 
     def __init__(self, name:str, g_dict:dict, parent_name:str, recur:str):
         self.name = name
@@ -16,16 +16,26 @@ class CreatureLink:
         return f"URDF Link\nName\t: {self.name}\nParent\t: {self.parent_name}\nRecur\t: {self.recur}\n"
     
 class Creature:
-    
-    __counter = 0
 
-    def __init__(self, gene_count):
-        self.dna = genome.Genome.init_genome(gene_count)
+    def __init__(self, gene_count, rng:np.random.Generator = None):
+        self.dna = genome.Genome.init_genome(gene_count, rng)
         self.start_position = (0, 0, 0)
         self.last_position = (0, 0, 0)
         self.motors = None
+        self.motor_bank = None
         self.__flat_links = None
+        self.__link_arrays = None
         self.__expanded_links = None
+        self.__link_stats = None
+
+    def __getstate__(self):
+        # expanded links and motors are rebuilt on demand from the flat links
+        # and link arrays, so they are left out of copies sent to other processes
+        state = self.__dict__.copy()
+        state["motors"] = None
+        state["motor_bank"] = None
+        state["_Creature__expanded_links"] = None
+        return state
 
     def update_dna(self, new_dna):
         assert len(genome.Genome.get_spec()) == new_dna.shape[-1]
@@ -33,8 +43,11 @@ class Creature:
         self.start_position = (0, 0, 0)
         self.last_position = (0, 0, 0)
         self.motors = None
+        self.motor_bank = None
         self.__flat_links = None
+        self.__link_arrays = None
         self.__expanded_links = None
+        self.__link_stats = None
 
     def reset_start_position(self, start_position):
         self.start_position = start_position
@@ -54,46 +67,110 @@ class Creature:
             self.__flat_links = Creature.genome_to_links(g_dicts)
         return self.__flat_links
 
+    def get_link_arrays(self):
+        # (parent, gene, sibling) index arrays of the expanded links
+        if self.__link_arrays == None:
+            flat_links = self.get_flat_links()
+            self.__link_arrays = Creature.expand_indices(*Creature.links_to_indices(flat_links))
+        return self.__link_arrays
+
     def get_expanded_links(self):
         if self.__expanded_links == None:
-            self.__expanded_links = Creature.expand_links(self.get_flat_links())
+            self.__expanded_links = Creature.indices_to_links(self.get_flat_links(), self.get_link_arrays())
         return self.__expanded_links
 
+    def get_link_stats(self):
+        # expanded link count, depth, max fan-out and total mass, without
+        # expanding any link
+        if self.__link_stats == None:
+            self.__link_stats = {key: value.item() for key, value in Creature.compute_link_stats(self.dna).items()}
+        return self.__link_stats
+
     def get_xml(self, robot_name = "robot"):
         adom = getDOMImplementation().createDocument(None, "start", None)
         robot_tag = adom.createElement("robot")
         robot_tag.setAttribute("name", robot_name)
 
+        _, _, siblings = self.get_link_arrays()
         for i, link in enumerate(self.get_expanded_links()):
-            link_tag, joint_tag = phenotype.BodyPart.body_part_xml(link.name, link.parent_name, link.g_dict, adom)
+            link_tag, joint_tag = phenotype.BodyPart.body_part_xml(link.name, link.parent_name, link.g_dict, adom, siblings[i])
             robot_tag.appendChild(link_tag)
             if i != 0:
                 robot_tag.appendChild(joint_tag)
 
         return robot_tag  
 
-    def write_xml(self, path):
+    def get_urdf(self, robot_name = "robot", pretty = True):
+        parts = [f'<robot name="{robot_name}">\n' if pretty else f'<robot name="{robot_name}">']
+        _, _, siblings = self.get_link_arrays()
+        for i, link in enumerate(self.get_expanded_links()):
+            link_str, joint_str = phenotype.BodyPart.body_part_urdf(link.name, link.parent_name, link.g_dict, siblings[i], pretty)
+            parts.append(link_str)
+            if i != 0:
+                parts.append(joint_str)
+        parts.append("</robot>\n" if pretty else "</robot>")
+        return "".join(parts)
+
+    def write_xml(self, path, pretty = True):
         with open(path, "w") as f:
-            xml_str = self.get_xml().toprettyxml()
+            xml_str = self.get_urdf(pretty = pretty)
             f.write(xml_str)
             
     def reset_motors(self):
         self.motors = None
+        self.motor_bank = None
     
     def get_motors(self):
         if self.motors == None:
             motors = []
-            for i, link in enumerate(self.get_expanded_links()):
-                if i == 0: continue
+            flat_links = self.get_flat_links()
+            _, genes, _ = self.get_link_arrays()
+            for gene in genes[1:]:
+                g_dict = flat_links[gene].g_dict
                 motors.append(phenotype.Motor(
-                    link.g_dict["control_motor_type"],
-                    link.g_dict["control_amplitude"],
-                    link.g_dict["control_step"],
-                    link.g_dict["control_param1"]
+                    g_dict["control_motor_type"],
+                    g_dict["control_amplitude"],
+                    g_dict["control_step"],
+                    g_dict["control_param1"]
                 ))
             self.motors = motors
         return self.motors
+
+    def get_motor_bank(self):
+        if self.motor_bank == None:
+            flat_links = self.get_flat_links()
+            _, genes, _ = self.get_link_arrays()
+            g_dicts = [flat_links[gene].g_dict for gene in genes[1:]]
+            self.motor_bank = phenotype.MotorBank(
+                [g_dict["control_motor_type"] for g_dict in g_dicts],
+                [g_dict["control_amplitude"] for g_dict in g_dicts],
+                [g_dict["control_step"] for g_dict in g_dicts],
+                [g_dict["control_param1"] for g_dict in g_dicts]
+            )
+        return self.motor_bank
     
+    @staticmethod
+    def compute_link_stats(dna:np.ndarray, lengths:np.ndarray = None):
+        # `get_link_stats` for a (genes, spec) matrix or a padded batch of them
+        copies = genome.Genome.count_link_copies(dna, lengths)
+        valid = copies > 0
+        masses = phenotype.BodyPart.get_link_masses(genome.Genome.decode(dna))
+        return {
+            "n_exp_links": copies.sum(axis = -1),
+            "depth": np.max(np.where(valid, genome.Genome.get_link_depths(dna, lengths), 0), axis = -1),
+            "max_fanout": np.max(genome.Genome.get_link_fanouts(dna, lengths), axis = -1),
+            "mass": np.sum(np.where(valid, copies * masses, 0), axis = -1),
+        }
+
+    @staticmethod
+    def compute_population_stats(creatures:list):
+        # `compute_link_stats` for creatures of different lengths in one batch
+        lengths = np.array([len(cr.dna) for cr in creatures])
+        dna = np.zeros((len(creatures), max(np.max(lengths, initial = 0), 1), len(genome.Genome.get_spec())))
+        for i, cr in enumerate(creatures):
+            dna[i, :lengths[i]] = cr.dna
+        return Creature.compute_link_stats(dna, lengths)
+
     @staticmethod
     def genome_to_links(g_dicts):
         link_names = ["Link_" + str(i) for i in range(len(g_dicts))]
@@ -111,46 +188,51 @@ class Creature:
     @staticmethod
     def expand_links(flat_links):
         assert flat_links[0].recur == 1
-        exp_links = Creature.__expand_links(flat_links)
-        Creature.__counter = 0
-        return exp_links
+        link_arrays = Creature.expand_indices(*Creature.links_to_indices(flat_links))
+        return Creature.indices_to_links(flat_links, link_arrays)
 
     @staticmethod
-    def __expand_links_recursive(parent, child_links, child_id = "0"):
-        p_copy = copy.copy(parent)
-        p_copy.name += ("_" + str(child_id) + "__ID_" + str(Creature.__counter))
-        Creature.__counter += 1
-        exp_links = [p_copy]
-        if len(child_links) > 0:
-            for i in range(child_links[0].recur):
-                child = Creature.__expand_links_recursive(child_links[0], child_links[1:], i)
-                c_copy = copy.copy(child)
-                c_copy[0].parent_name = p_copy.name
-                exp_links.extend(c_copy)
-        return exp_links
-    
+    def links_to_indices(flat_links):
+        flat_indices = {link.name: i for i, link in enumerate(flat_links)}
+        parent_indices = np.array([flat_indices.get(link.parent_name, -1) for link in flat_links])
+        recurs = np.array([link.recur for link in flat_links])
+        return parent_indices, recurs
+
     @staticmethod
-    def __expand_links(flat_links):
+    def expand_indices(parent_indices:np.ndarray, recurs:np.ndarray):
+        # every flat link is repeated `recur` times under every expanded copy
+        # of its parent; copies maps a flat index to its expanded indices
+        copies = [np.zeros(1, dtype = int)]
+        exp_parents = [np.full(1, -1)]
+        exp_genes = [np.zeros(1, dtype = int)]
+        exp_siblings = [np.zeros(1, dtype = int)]
+        n_exp_links = 1
+
+        for i in range(1, len(parent_indices)):
+            parents = copies[parent_indices[i]]
+            recur = recurs[i]
+            count = len(parents) * recur
+            copies.append(np.arange(n_exp_links, n_exp_links + count))
+            exp_parents.append(np.repeat(parents, recur))
+            exp_genes.append(np.full(count, i))
+            exp_siblings.append(np.tile(np.arange(recur), len(parents)))
+            n_exp_links += count
+
+        return (np.concatenate(exp_parents),
+                np.concatenate(exp_genes),
+                np.concatenate(exp_siblings))
+
+    @staticmethod
+    def indices_to_links(flat_links, link_arrays):
+        exp_parents, exp_genes, exp_siblings = link_arrays
         exp_links = []
-        counter = 0
-        
-        for i in range(len(flat_links)):
+        for i, (parent, gene, sibling) in enumerate(zip(exp_parents.tolist(), exp_genes.tolist(), exp_siblings.tolist())):
+            flat_link = flat_links[gene]
             if i == 0:
-                child = copy.copy(flat_links[i])
-                child.name += "__ID_" + str(counter)
-                exp_links.append(child)
-                counter += 1
-                continue
-            
-            parent_name = flat_links[i].parent_name
-            parents = [l for l in exp_links if l.name.startswith(parent_name)]
-
-            for parent in parents:
-                for j in range(flat_links[i].recur):
-                    child = copy.copy(flat_links[i])
-                    child.name += "_" + str(j) + "__ID_" + str(counter)
-                    child.parent_name = parent.name
-                    exp_links.append(child)
-                    counter += 1
-    
+                name = flat_link.name + "__ID_0"
+                parent_name = flat_link.parent_name
+            else:
+                name = flat_link.name + "_" + str(sibling) + "__ID_" + str(i)
+                parent_name = exp_links[parent].name
+            exp_links.append(CreatureLink(name, flat_link.g_dict, parent_name, flat_link.recur))
         return exp_links
\ No newline at end of file
@@ -1,7 +1,7 @@
 import copy
 import warnings
 import numpy as np
-from creatures import creature
+from creatures import creature, genome
 
 def normalize(data):
     if (np.max(data) - np.min(data)) == 0:
@@ -17,7 +17,7 @@ class Selection:
     def eval_fitness(creatures:list[creature.Creature], gamma = 0.25):
         start_points = np.array([cr.start_position for cr in creatures])
         finish_points = np.array([cr.last_position for cr in creatures])
-        n_exp_links = np.array([len(cr.get_expanded_links()) for cr in creatures])
+        n_exp_links = creature.Creature.compute_population_stats(creatures)["n_exp_links"]
         fits = np.linalg.norm(finish_points - start_points, axis = 1)
         
         # remove NaN, if any
@@ -41,48 +41,74 @@ class Selection:
         return fits
 
     @staticmethod
-    def select_parents(creatures:list[creature.Creature], fits:np.ndarray):
+    def select_parents(creatures:list[creature.Creature], fits:np.ndarray, rng:np.random.Generator = None):
+        ind_parent1, ind_parent2 = Selection.select_parent_pairs(fits, 1, rng)[0]
+        return creatures[ind_parent1], creatures[ind_parent2]
+
+    @staticmethod
+    def select_parent_pairs(fits:np.ndarray, num_of_pairs:int, rng:np.random.Generator = None):
+        # roulette wheel over the cumulative probabilities, drawing the second
+        # parent of every pair from the wheel with the first parent removed
+        rng = np.random.default_rng() if rng is None else rng
+        fits = np.asarray(fits, dtype = float)
         probs = fits / np.sum(fits)
         probs = np.nan_to_num(probs, nan = 0)
-        ind_parent1, ind_parent2 = np.random.choice(range(len(fits)), 2, False, probs)
-        return creatures[ind_parent1], creatures[ind_parent2]
+        cum_probs = np.cumsum(probs)
+        total = cum_probs[-1]
+        draws = rng.random((num_of_pairs, 2))
+
+        ind_parent1 = np.searchsorted(cum_probs, draws[:, 0] * total, side = "right")
+        ind_parent1 = np.minimum(ind_parent1, len(fits) - 1)
+
+        parent1_probs = probs[ind_parent1]
+        offsets = draws[:, 1] * (total - parent1_probs)
+        offsets = offsets + parent1_probs * (offsets >= cum_probs[ind_parent1] - parent1_probs)
+        ind_parent2 = np.searchsorted(cum_probs, offsets, side = "right")
+        ind_parent2 = np.minimum(ind_parent2, len(fits) - 1)
+
+        return np.stack((ind_parent1, ind_parent2), axis = 1)
 
 class Mutation:
     @staticmethod
-    def mutate_point(dna:np.ndarray, mutation_freq:float, mutation_amnt: float = 0.1):
+    def mutate_point(dna:np.ndarray, mutation_freq:float, mutation_amnt: float = 0.1, rng:np.random.Generator = None):
+        rng = np.random.default_rng() if rng is None else rng
         mutated_dna = copy.copy(dna)
-        mutated = np.random.choice((True, False), size = mutated_dna.shape, replace = True, p = (mutation_freq, 1-mutation_freq))
+        mutated = rng.choice((True, False), size = mutated_dna.shape, replace = True, p = (mutation_freq, 1-mutation_freq))
         mutated_dna[mutated] = np.maximum(
-            0.0001 + np.random.random() / 1000,
+            0.0001 + rng.random() / 1000,
             np.minimum(
-                0.9999 - np.random.random() / 1000,
-                mutated_dna[mutated] + (np.random.random() * mutation_amnt) - (mutation_amnt / 2)
+                0.9999 - rng.random() / 1000,
+                mutated_dna[mutated] + (rng.random() * mutation_amnt) - (mutation_amnt / 2)
             )
         )
         return mutated_dna
     
     @staticmethod
-    def mutate_shrink(dna:np.ndarray, mutation_freq:float, min_length:int = 2):
+    def mutate_shrink(dna:np.ndarray, mutation_freq:float, min_length:int = 2, rng:np.random.Generator = None):
+        rng = np.random.default_rng() if rng is None else rng
         mutated_dna = copy.copy(dna)
-        mutation = np.random.choice((True, False), size = len(mutated_dna), replace = True, p = (mutation_freq, 1-mutation_freq))
+        mutation = rng.choice((True, False), size = len(mutated_dna), replace = True, p = (mutation_freq, 1-mutation_freq))
         mutated_dna = np.delete(mutated_dna, mutation, axis = 0)
         if len(mutated_dna) < min_length:
             mutated_dna = dna[:min_length]
         return mutated_dna
     
     @staticmethod
-    def mutate_grow(dna:np.ndarray, mutation_freq:float, max_length:int = 15):
+    def mutate_grow(dna:np.ndarray, mutation_freq:float, max_length:int = 15, rng:np.random.Generator = None):
+        rng = np.random.default_rng() if rng is None else rng
         mutated_dna = copy.copy(dna)
-        mutation = np.random.choice((True, False), size = len(mutated_dna), replace = True, p = (mutation_freq, 1-mutation_freq))
+        mutation = rng.choice((True, False), size = len(mutated_dna), replace = True, p = (mutation_freq, 1-mutation_freq))
         mutated_dna = np.append(mutated_dna, mutated_dna[mutation], axis = 0)
         return mutated_dna[:max_length]
     
 class Mating:
     @staticmethod
-    def mate_grafting(dna1:np.ndarray, dna2:np.ndarray, min_length:int = 2, max_length:int = 15, max_growth_rt:float = 1.2):
+    def mate_grafting(dna1:np.ndarray, dna2:np.ndarray, min_length:int = 2, max_length:int = 15, max_growth_rt:float = 1.2,
+                      rng:np.random.Generator = None):
+        rng = np.random.default_rng() if rng is None else rng
         max_length = np.minimum(max_length, int(np.maximum(len(dna1), len(dna2)) * max_growth_rt))
-        ind_1 = np.random.randint(1, len(dna1)+1)
-        ind_2 = np.random.randint(0, len(dna2))
+        ind_1 = rng.integers(1, len(dna1)+1)
+        ind_2 = rng.integers(0, len(dna2))
         child_dna = np.concatenate((dna1[:ind_1], dna2[ind_2:]))
         
         if len(child_dna) >= min_length:
@@ -91,10 +117,12 @@ class Mating:
             return np.concatenate((dna1[:(min_length - len(child_dna))], child_dna))
 
     @staticmethod
-    def mate_crossover(dna1:np.ndarray, dna2:np.ndarray, min_length:int = 2, max_length:int = 15, max_growth_rt = 1.2):
+    def mate_crossover(dna1:np.ndarray, dna2:np.ndarray, min_length:int = 2, max_length:int = 15, max_growth_rt = 1.2,
+                       rng:np.random.Generator = None):
+        rng = np.random.default_rng() if rng is None else rng
         max_length = np.minimum(max_length, int(np.maximum(len(dna1), len(dna2)) * max_growth_rt))
-        indices1 = np.sort(np.random.choice(range(len(dna1)), 2, replace = False))
-        indices2 = np.sort(np.random.choice(range(len(dna2)), 2, replace = False))
+        indices1 = np.sort(rng.choice(len(dna1), 2, replace = False))
+        indices2 = np.sort(rng.choice(len(dna2), 2, replace = False))
         child_dna = np.concatenate((dna1[:indices1[0]], dna2[indices2[0]:indices2[1]], dna1[indices1[1]:]))
         
         if len(child_dna) >= min_length:
@@ -109,14 +137,182 @@ class Mating:
              max_length:int,
              max_growth_rt:float,
              mutation_freq:float,
-             mutation_amnt:float):
+             mutation_amnt:float,
+             rng:np.random.Generator = None):
+        rng = np.random.default_rng() if rng is None else rng
         # select the mating method
-        if np.random.random() < 0.5:
-            child_dna = Mating.mate_grafting(dna1, dna2, min_length, max_length, max_growth_rt)
+        if rng.random() < 0.5:
+            child_dna = Mating.mate_grafting(dna1, dna2, min_length, max_length, max_growth_rt, rng)
         else:
-            child_dna = Mating.mate_crossover(dna1, dna2, min_length, max_length, max_growth_rt)
+            child_dna = Mating.mate_crossover(dna1, dna2, min_length, max_length, max_growth_rt, rng)
             
-        child_dna = Mutation.mutate_shrink(child_dna, mutation_freq, min_length)
-        child_dna = Mutation.mutate_grow(child_dna, mutation_freq, max_length)
-        child_dna = Mutation.mutate_point(child_dna, mutation_freq, mutation_amnt)
-        return child_dna
\ No newline at end of file
+        child_dna = Mutation.mutate_shrink(child_dna, mutation_freq, min_length, rng)
+        child_dna = Mutation.mutate_grow(child_dna, mutation_freq, max_length, rng)
+        child_dna = Mutation.mutate_point(child_dna, mutation_freq, mutation_amnt, rng)
+        return child_dna
+
+class BatchMating:
+    # the `Mating.mate` pipeline for a whole generation at once: parents are
+    # rows of a padded (creatures, max_length, genes) array with a length
+    # vector, such as a `DNAArena`, and children come back in the same form.
+    # Every random choice is drawn as one array per step
+    @staticmethod
+    def mate(dna:np.ndarray,
+             lengths:np.ndarray,
+             parents1:np.ndarray,
+             parents2:np.ndarray,
+             min_length:int,
+             max_length:int,
+             max_growth_rt:float,
+             mutation_freq:float,
+             mutation_amnt:float,
+             rng:np.random.Generator = None,
+             max_expanded_length:float = None):
+        rng = np.random.default_rng() if rng is None else rng
+        children, child_lengths = BatchMating.mate_segments(dna, lengths, parents1, parents2, min_length, max_length, max_growth_rt, rng)
+        children, child_lengths = BatchMating.mutate_shrink(children, child_lengths, mutation_freq, min_length, rng)
+        children, child_lengths = BatchMating.mutate_grow(children, child_lengths, mutation_freq, max_length, rng)
+        children = BatchMating.mutate_point(children, child_lengths, mutation_freq, mutation_amnt, rng)
+        if max_expanded_length is not None:
+            children, child_lengths, _ = BatchMating.trim_expanded(children, child_lengths, max_expanded_length, min_length)
+        return children, child_lengths
+
+    @staticmethod
+    def mate_segments(dna:np.ndarray,
+                      lengths:np.ndarray,
+                      parents1:np.ndarray,
+                      parents2:np.ndarray,
+                      min_length:int = 2,
+                      max_length:int = 15,
+                      max_growth_rt:float = 1.2,
+                      rng:np.random.Generator = None):
+        # every child is up to four (parent, start, length) segments: a prefix
+        # of parent 1 for children below `min_length`, then either grafting
+        # (head of parent 1, tail of parent 2) or crossover (parent 1 with a
+        # middle part of parent 2)
+        rng = np.random.default_rng() if rng is None else rng
+        parents1 = np.asarray(parents1, dtype = int)
+        parents2 = np.asarray(parents2, dtype = int)
+        len1 = np.asarray(lengths)[parents1].astype(int)
+        len2 = np.asarray(lengths)[parents2].astype(int)
+        n = len(parents1)
+
+        grafting = rng.random(n) < 0.5
+        cut1 = 1 + (rng.random(n) * len1).astype(int)
+        cut2 = (rng.random(n) * len2).astype(int)
+        a0, a1 = BatchMating.__distinct_pairs(len1, rng)
+        b0, b1 = BatchMating.__distinct_pairs(len2, rng)
+
+        seg_parents = np.stack((parents1, parents1, parents2, parents1), axis = 1)
+        seg_starts = np.zeros((n, 4), dtype = int)
+        seg_lengths = np.zeros((n, 4), dtype = int)
+        seg_starts[:, 2] = np.where(grafting, cut2, b0)
+        seg_starts[:, 3] = a1
+        seg_lengths[:, 1] = np.where(grafting, cut1, a0)
+        seg_lengths[:, 2] = np.where(grafting, len2 - cut2, b1 - b0)
+        seg_lengths[:, 3] = np.where(grafting, 0, len1 - a1)
+
+        child_lengths = seg_lengths.sum(axis = 1)
+        growth_lengths = np.minimum(max_length, (np.maximum(len1, len2) * max_growth_rt).astype(int))
+        short = child_lengths < min_length
+        seg_lengths[:, 0] = np.where(short, np.minimum(min_length - child_lengths, len1), 0)
+        child_lengths = np.where(short, seg_lengths.sum(axis = 1), np.minimum(child_lengths, growth_lengths))
+
+        # map every row of a child to its segment, then to a parent row
+        width = max(int(np.max(child_lengths, initial = 0)), 1)
+        rows = np.arange(width)
+        seg_ends = np.cumsum(seg_lengths, axis = 1)
+        seg_ids = np.minimum((rows[None, :, None] >= seg_ends[:, None, :]).sum(axis = 2), 3)
+        seg_offsets = rows[None, :] - np.take_along_axis(seg_ends - seg_lengths, seg_ids, axis = 1)
+        src_parents = np.take_along_axis(seg_parents, seg_ids, axis = 1)
+        src_rows = np.take_along_axis(seg_starts, seg_ids, axis = 1) + seg_offsets
+        valid = rows[None, :] < child_lengths[:, None]
+        src_rows = np.where(valid, np.clip(src_rows, 0, dna.shape[1] - 1), 0)
+
+        children = dna[src_parents, src_rows] * valid[..., None]
+        return children, child_lengths
+
+    @staticmethod
+    def mutate_shrink(children:np.ndarray, lengths:np.ndarray, mutation_freq:float, min_length:int = 2, rng:np.random.Generator = None):
+        # drops rows, or keeps the first `min_length` rows when too few are left
+        rng = np.random.default_rng() if rng is None else rng
+        valid = np.arange(children.shape[1])[None, :] < lengths[:, None]
+        keep = valid & ~(rng.random(valid.shape) < mutation_freq)
+        new_lengths = keep.sum(axis = 1)
+        fallback = new_lengths < min_length
+        keep[fallback] = (np.arange(children.shape[1])[None, :] < np.minimum(min_length, lengths[fallback])[:, None])
+        new_lengths = keep.sum(axis = 1)
+        return BatchMating.__compact(children, keep, new_lengths), new_lengths
+
+    @staticmethod
+    def mutate_grow(children:np.ndarray, lengths:np.ndarray, mutation_freq:float, max_length:int = 15, rng:np.random.Generator = None):
+        # appends copies of randomly picked rows, up to `max_length` rows
+        rng = np.random.default_rng() if rng is None else rng
+        width = children.shape[1]
+        valid = np.arange(width)[None, :] < lengths[:, None]
+        picked = valid & (rng.random(valid.shape) < mutation_freq)
+        n_picked = picked.sum(axis = 1)
+        picked_rows = BatchMating.__compact(children, picked, n_picked)
+
+        rows = np.arange(2 * width)[None, :]
+        grown = np.concatenate((children, np.zeros_like(children)), axis = 1)
+        appended = rows - lengths[:, None]
+        appending = (appended >= 0) & (appended < n_picked[:, None])
+        sources = np.take_along_axis(picked_rows, np.clip(appended, 0, width - 1)[..., None], axis = 1)
+        grown = np.where(appending[..., None], sources, grown)
+
+        new_lengths = np.minimum(lengths + n_picked, max_length)
+        new_width = max(int(np.max(new_lengths, initial = 0)), 1)
+        grown = grown[:, :new_width] * (rows[:, :new_width] < new_lengths[:, None])[..., None]
+        return grown, new_lengths
+
+    @staticmethod
+    def mutate_point(children:np.ndarray, lengths:np.ndarray, mutation_freq:float, mutation_amnt:float = 0.1, rng:np.random.Generator = None):
+        # like `Mutation.mutate_point`, one shift and clipping range per child
+        rng = np.random.default_rng() if rng is None else rng
+        n = len(children)
+        valid = np.arange(children.shape[1])[None, :] < lengths[:, None]
+        mutated = valid[..., None] & (rng.random(children.shape) < mutation_freq)
+        lows = (0.0001 + rng.random(n) / 1000)[:, None, None]
+        highs = (0.9999 - rng.random(n) / 1000)[:, None, None]
+        shifts = (rng.random(n) * mutation_amnt - mutation_amnt / 2)[:, None, None]
+        return np.where(mutated, np.maximum(lows, np.minimum(highs, children + shifts)), children)
+
+    @staticmethod
+    def trim_expanded(children:np.ndarray, lengths:np.ndarray, max_expanded_length:float, min_length:int = 2):
+        # brings children over `max_expanded_length` expanded links under it
+        # in bounded time instead of mating them again: links only copy their
+        # parents, which come earlier, so dropping trailing genes never changes
+        # the earlier counts and the longest fitting prefix is kept. When the
+        # first `min_length` genes alone are too large, their recurrences are
+        # set to 1 from the last gene backwards
+        rec_index = genome.Genome.get_spec()["link_recurrence"]["index"]
+        children = children.copy()
+        copies = genome.Genome.count_link_copies(children, lengths)
+        repaired = copies.sum(axis = 1) > max_expanded_length
+
+        fitting = (np.cumsum(copies, axis = 1) <= max_expanded_length).sum(axis = 1)
+        min_lengths = np.minimum(min_length, lengths)
+        new_lengths = np.where(repaired, np.maximum(fitting, min_lengths), lengths)
+        for i in range(int(np.max(min_lengths, initial = 0)) - 1, 0, -1):
+            oversized = genome.Genome.count_expanded_links(children, new_lengths) > max_expanded_length
+            children[oversized & (i < new_lengths), i, rec_index] = 0
+
+        children = children * (np.arange(children.shape[1])[None, :] < new_lengths[:, None])[..., None]
+        return children, new_lengths, repaired
+
+    @staticmethod
+    def __distinct_pairs(lengths:np.ndarray, rng:np.random.Generator):
+        # two different sorted row indices below every length
+        first = (rng.random(len(lengths)) * lengths).astype(int)
+        second = (rng.random(len(lengths)) * np.maximum(lengths - 1, 1)).astype(int)
+        second = second + (second >= first)
+        second = np.minimum(second, np.maximum(lengths - 1, 0))
+        return np.minimum(first, second), np.maximum(first, second)
+
+    @staticmethod
+    def __compact(children:np.ndarray, keep:np.ndarray, lengths:np.ndarray):
+        # moves the kept rows to the front, in order, and zeroes the rest
+        order = np.argsort(~keep, axis = 1, kind = "stable")
+        compacted = np.take_along_axis(children, order[..., None], axis = 1)
+        return compacted * (np.arange(children.shape[1])[None, :] < lengths[:, None])[..., None]
@@ -3,28 +3,103 @@ import numpy as np
 
 class Genome:
     __spec = None
+    __decoder = None
 
     @staticmethod
-    def init_genome(gene_count:int):
+    def init_genome(gene_count:int, rng:np.random.Generator = None):
+        rng = np.random.default_rng() if rng is None else rng
         gene_size = len(Genome.get_spec())
-        return np.random.rand(gene_count, gene_size)
+        return rng.random((gene_count, gene_size))
     
     @staticmethod
     def to_dict(dna:np.ndarray):
         assert dna.shape[1] == len(Genome.get_spec())
-        g_dicts = []
+        genes = Genome.decode(dna)
+        keys = genes.dtype.names
+        return [dict(zip(keys, values)) for values in genes.tolist()]
+
+    @staticmethod
+    def decode(dna:np.ndarray):
+        # decode a (genes, spec) matrix, or a batch of them with any leading
+        # dimensions, into a structured array with one field per spec key
         spec = Genome.get_spec()
-        for i in range(dna.shape[0]):
-            g_dict = {}
-            for key in spec.keys():
-                value = dna[i][spec[key]["index"]] * spec[key]["scale"]
-                if spec[key]["type"] == "discrete":
-                    value = int(value) + 1
-                elif spec[key]["type"] == "categorical":
-                    value = int(value)
-                g_dict[key] = value
-            g_dicts.append(g_dict)
-        return g_dicts
+        assert dna.shape[-1] == len(spec)
+        scales, dtype = Genome.get_decoder()
+        values = dna * scales
+        genes = np.empty(values.shape[:-1], dtype = dtype)
+        for key in spec.keys():
+            column = values[..., spec[key]["index"]]
+            if spec[key]["type"] == "discrete":
+                genes[key] = column.astype(np.int64) + 1
+            elif spec[key]["type"] == "categorical":
+                genes[key] = column.astype(np.int64)
+            else:
+                genes[key] = column
+        return genes
+
+    @staticmethod
+    def get_link_tree(dna:np.ndarray, lengths:np.ndarray = None):
+        # parent index and recurrence of every flat link, as
+        # `Creature.genome_to_links` derives them, for a (genes, spec) matrix
+        # or a padded batch; links past `lengths` recur 0 times
+        spec = Genome.get_spec()
+        assert dna.shape[-1] == len(spec)
+        n_genes = dna.shape[-2]
+        positions = np.arange(n_genes)
+        parents = np.floor(dna[..., spec["parent_link"]["index"]] * np.maximum(positions - 1, 0)).astype(np.int64)
+        recurs = (dna[..., spec["link_recurrence"]["index"]] * spec["link_recurrence"]["scale"]).astype(np.int64) + 1
+        parents[..., 0] = -1
+        recurs[..., 0] = 1
+        if lengths is not None:
+            recurs = np.where(positions < np.asarray(lengths)[..., None], recurs, 0)
+        return parents, recurs
+
+    @staticmethod
+    def count_link_copies(dna:np.ndarray, lengths:np.ndarray = None):
+        # number of expanded copies of every flat link: the product of the
+        # recurrences along its chain of parents
+        parents, recurs = Genome.get_link_tree(dna, lengths)
+        copies = np.zeros(recurs.shape, dtype = np.int64)
+        copies[..., 0] = recurs[..., 0]
+        for i in range(1, recurs.shape[-1]):
+            parent_copies = np.take_along_axis(copies, parents[..., i:i+1], axis = -1)[..., 0]
+            copies[..., i] = parent_copies * recurs[..., i]
+        return copies
+
+    @staticmethod
+    def count_expanded_links(dna:np.ndarray, lengths:np.ndarray = None):
+        # `len(Creature.expand_links(...))` without building any link
+        return Genome.count_link_copies(dna, lengths).sum(axis = -1)
+
+    @staticmethod
+    def get_link_depths(dna:np.ndarray, lengths:np.ndarray = None):
+        # number of joints between every flat link and the root; all the
+        # expanded copies of a link are at its depth
+        parents, _ = Genome.get_link_tree(dna, lengths)
+        depths = np.zeros(parents.shape, dtype = np.int64)
+        for i in range(1, parents.shape[-1]):
+            depths[..., i] = np.take_along_axis(depths, parents[..., i:i+1], axis = -1)[..., 0] + 1
+        return depths
+
+    @staticmethod
+    def get_link_fanouts(dna:np.ndarray, lengths:np.ndarray = None):
+        # number of children of every expanded copy of a flat link
+        parents, recurs = Genome.get_link_tree(dna, lengths)
+        fanouts = np.zeros(parents.shape, dtype = np.int64)
+        for i in range(1, parents.shape[-1]):
+            parent = parents[..., i:i+1]
+            np.put_along_axis(fanouts, parent, np.take_along_axis(fanouts, parent, axis = -1) + recurs[..., i:i+1], axis = -1)
+        return fanouts
+
+    @staticmethod
+    def get_decoder():
+        if Genome.__decoder == None:
+            spec = Genome.get_spec()
+            scales = np.array([spec[key]["scale"] for key in spec.keys()], dtype = np.float64)
+            dtype = np.dtype([(key, np.float64 if spec[key]["type"] == "continuous" else np.int64)
+                              for key in spec.keys()])
+            Genome.__decoder = (scales, dtype)
+        return Genome.__decoder
 
     @staticmethod
     def get_spec():
@@ -3,6 +3,7 @@ import numpy as np
 
 
 class BodyPart:
+    __urdf_templates = None
 
     @staticmethod
     def get_link_shapes():
@@ -19,7 +20,18 @@ class BodyPart:
         return ("1 0 0", "0 1 0", "0 0 1")
 
     @staticmethod
-    def body_part_xml(name, parent_name, g_dict, adom, sib_ind = None):
+    def get_link_masses(genes:np.ndarray):
+        # the masses `body_part_attrs` gives, for a structured array of
+        # decoded genes of any shape
+        shapes = np.asarray(BodyPart.get_link_shapes())[genes["link_shape"]]
+        lengths = np.stack((genes["link_length_1"], genes["link_length_2"], genes["link_length_3"]))
+        volumes = np.where(shapes == "box", np.prod(lengths, axis = 0),
+                  np.where(shapes == "cylinder", np.pi * (genes["link_length_1"] ** 2) * np.mean(lengths, axis = 0),
+                           4 / 3 * np.pi * (genes["link_radius"] ** 3)))
+        return volumes * genes["link_mass_density"]
+
+    @staticmethod
+    def body_part_attrs(name, g_dict, sib_ind = None):
         link_shape = BodyPart.get_link_shapes()[ g_dict["link_shape"] ]
         joint_type = BodyPart.get_joint_types()[ g_dict["joint_type"] ]
         joint_axis = BodyPart.get_joint_axes()[ g_dict["joint_axis_xyz"] ]
@@ -30,16 +42,14 @@ class BodyPart:
             except:
                 sib_ind = 0
 
-        shape_tag = adom.createElement(link_shape)
         if link_shape == "box":
             link_size = " ".join([str(g_dict["link_length_1"]), str(g_dict["link_length_2"]), str(g_dict["link_length_3"])])
-            shape_tag.setAttribute("size", str(link_size))
+            shape_attrs = (("size", str(link_size)),)
             link_volume    = g_dict["link_length_1"] * g_dict["link_length_2"] *  g_dict["link_length_3"]
         elif link_shape =="cylinder":
             link_length = np.mean([g_dict["link_length_1"], g_dict["link_length_2"], g_dict["link_length_3"]]) * 0.83 # rate to limit a maximum volume of 1
             link_radius = g_dict["link_radius"] * 0.62 # rate to limit a maximum volume of 1
-            shape_tag.setAttribute("radius", str(link_radius))
-            shape_tag.setAttribute("length", str(link_length))
+            shape_attrs = (("radius", str(link_radius)), ("length", str(link_length)))
             link_volume = np.pi * (g_dict["link_length_1"] ** 2) * np.mean([
                 g_dict["link_length_1"],
                 g_dict["link_length_2"],
@@ -47,14 +57,40 @@ class BodyPart:
             ])
         else:
             link_radius = g_dict["link_radius"] * 0.62 # rate to limit a maximum volume of 1
-            shape_tag.setAttribute("radius", str(link_radius))
+            shape_attrs = (("radius", str(link_radius)),)
             link_volume = 4 / 3 * np.pi * (g_dict["link_radius"] ** 3)
 
         link_mass = link_volume * g_dict["link_mass_density"]
 
+        return {
+            "link_shape": link_shape,
+            "shape_attrs": shape_attrs,
+            "mass": str(link_mass),
+            "joint_type": joint_type,
+            "joint_axis": str(joint_axis),
+            "origin_xyz": " ".join([
+                str(g_dict["joint_origin_xyz_1"] * sib_ind),
+                str(g_dict["joint_origin_xyz_2"]),
+                str(g_dict["joint_origin_xyz_3"])
+            ]),
+            "origin_rpy": " ".join([
+                str(g_dict["joint_origin_rpy_1"]),
+                str(g_dict["joint_origin_rpy_2"]),
+                str(g_dict["joint_origin_rpy_3"])            
+            ]),
+        }
+
+    @staticmethod
+    def body_part_xml(name, parent_name, g_dict, adom, sib_ind = None):
+        attrs = BodyPart.body_part_attrs(name, g_dict, sib_ind)
+
+        shape_tag = adom.createElement(attrs["link_shape"])
+        for key, value in attrs["shape_attrs"]:
+            shape_tag.setAttribute(key, value)
+
         # ----- LINK TAG -----
         mass_tag = adom.createElement("mass")
-        mass_tag.setAttribute("value", str(link_mass))
+        mass_tag.setAttribute("value", attrs["mass"])
 
         inertia_tag = adom.createElement("inertia")
         inertia_tag.setAttribute("ixx", "0.03")  
@@ -91,19 +127,11 @@ class BodyPart:
         joint_child_tag.setAttribute("link", name)
 
         joint_origin_tag = adom.createElement("origin")
-        joint_origin_tag.setAttribute("xyz", " ".join([
-            str(g_dict["joint_origin_xyz_1"] * sib_ind),
-            str(g_dict["joint_origin_xyz_2"]),
-            str(g_dict["joint_origin_xyz_3"])
-        ]))
-        joint_origin_tag.setAttribute("rpy", " ".join([
-            str(g_dict["joint_origin_rpy_1"]),
-            str(g_dict["joint_origin_rpy_2"]),
-            str(g_dict["joint_origin_rpy_3"])            
-        ]))
+        joint_origin_tag.setAttribute("xyz", attrs["origin_xyz"])
+        joint_origin_tag.setAttribute("rpy", attrs["origin_rpy"])
 
         joint_axis_tag = adom.createElement("axis")
-        joint_axis_tag.setAttribute("xyz", str(joint_axis))
+        joint_axis_tag.setAttribute("xyz", attrs["joint_axis"])
 
         joint_limit_tag = adom.createElement("limit")
         joint_limit_tag.setAttribute("effort", "1")
@@ -113,7 +141,7 @@ class BodyPart:
 
         joint_tag = adom.createElement("joint")
         joint_tag.setAttribute("name", "joint_" + name)
-        joint_tag.setAttribute("type", joint_type)
+        joint_tag.setAttribute("type", attrs["joint_type"])
         joint_tag.appendChild(joint_parent_tag)
         joint_tag.appendChild(joint_child_tag)
         joint_tag.appendChild(joint_axis_tag)
@@ -121,9 +149,66 @@ class BodyPart:
         joint_tag.appendChild(joint_limit_tag)
 
         return link_tag, joint_tag
+
+    @staticmethod
+    def body_part_urdf(name, parent_name, g_dict, sib_ind = None, pretty = True):
+        # string counterpart of `body_part_xml`, matching the output of
+        # minidom's `toprettyxml()` (pretty) or `toxml()` (compact)
+        attrs = BodyPart.body_part_attrs(name, g_dict, sib_ind)
+        link_template, joint_template = BodyPart.get_urdf_templates(pretty)
+
+        shape = "".join(["<", attrs["link_shape"]] +
+                        [f' {key}="{value}"' for key, value in attrs["shape_attrs"]] +
+                        ["/>"])
+        link_str = link_template.format(name = name, shape = shape, mass = attrs["mass"])
+        joint_str = joint_template.format(name = name,
+                                          parent_name = parent_name,
+                                          joint_type = attrs["joint_type"],
+                                          joint_axis = attrs["joint_axis"],
+                                          origin_xyz = attrs["origin_xyz"],
+                                          origin_rpy = attrs["origin_rpy"])
+        return link_str, joint_str
+
+    @staticmethod
+    def get_urdf_templates(pretty = True):
+        if BodyPart.__urdf_templates == None:
+            link_template = "".join([
+                '\t<link name="{name}">\n',
+                '\t\t<visual>\n',
+                '\t\t\t<geometry>\n',
+                '\t\t\t\t{shape}\n',
+                '\t\t\t</geometry>\n',
+                '\t\t</visual>\n',
+                '\t\t<collision>\n',
+                '\t\t\t<geometry>\n',
+                '\t\t\t\t{shape}\n',
+                '\t\t\t</geometry>\n',
+                '\t\t</collision>\n',
+                '\t\t<inertial>\n',
+                '\t\t\t<mass value="{mass}"/>\n',
+                '\t\t\t<inertia ixx="0.03" ixy="0.03" ixz="0.03" iyy="0" iyz="0" izz="0"/>\n',
+                '\t\t</inertial>\n',
+                '\t</link>\n',
+            ])
+            joint_template = "".join([
+                '\t<joint name="joint_{name}" type="{joint_type}">\n',
+                '\t\t<parent link="{parent_name}"/>\n',
+                '\t\t<child link="{name}"/>\n',
+                '\t\t<axis xyz="{joint_axis}"/>\n',
+                '\t\t<origin xyz="{origin_xyz}" rpy="{origin_rpy}"/>\n',
+                f'\t\t<limit effort="1" upper="{-np.pi}" lower="{np.pi}" velocity="1"/>\n',
+                '\t</joint>\n',
+            ])
+            compact = lambda template: template.replace("\t", "").replace("\n", "")
+            BodyPart.__urdf_templates = {
+                True: (link_template, joint_template),
+                False: (compact(link_template), compact(joint_template)),
+            }
+        return BodyPart.__urdf_templates[pretty]
     
 
 class Motor:
+    __slots__ = ("motor_type", "step_size", "amplitude", "param1", "param2", "phase")
 
     def __init__(self, motor_type:int, step_size:float, amplitude:float, param1:float):
         self.motor_type = motor_type
@@ -146,4 +231,38 @@ class Motor:
         return velocity
     
     def __repr__(self):
-        return f"Motor\nType\t: {self.motor_type}\nAmp\t: {self.amp}\nFreq\t: {self.freq}\n"
\ No newline at end of file
+        return f"Motor\nType\t: {self.motor_type}\nAmp\t: {self.amplitude}\nStep\t: {self.step_size}\n"
+
+
+class MotorBank:
+
+    def __init__(self, motor_types, step_sizes, amplitudes, params1):
+        self.motor_types = np.asarray(motor_types, dtype = int)
+        self.step_sizes  = np.asarray(step_sizes, dtype = float)
+        self.amplitudes  = np.asarray(amplitudes, dtype = float)
+        self.params1     = np.asarray(params1, dtype = float)
+        self.params2     = 1 - self.params1
+        self.phases      = np.zeros(len(self.motor_types))
+        if np.any((self.motor_types < 0) | (self.motor_types > 2)):
+            raise Exception("Invalid motor type")
+
+    def __len__(self):
+        return len(self.motor_types)
+
+    def __call__(self):
+        # same velocities as calling every `Motor` in turn, for all joints at once
+        self.phases = self.phases + self.step_sizes
+        square = self.amplitudes * ((-1.0) ** np.ceil(self.phases % (np.pi * 2)))
+        sine = self.amplitudes * np.sin(np.pi * self.phases)
+        compound = self.amplitudes * np.sin(self.params1 * np.pi * self.phases) * np.sin(self.params2 * np.pi * self.phases)
+        return np.select((self.motor_types == 0, self.motor_types == 1), (square, sine), compound)
+
+    def __repr__(self):
+        return f"MotorBank\nMotors\t: {len(self)}\nTypes\t: {self.motor_types}\n"
+
+    @staticmethod
+    def from_motors(motors:list[Motor]):
+        return MotorBank([m.motor_type for m in motors],
+                         [m.step_size for m in motors],
+                         [m.amplitude for m in motors],
+                         [m.param1 for m in motors])
\ No newline at end of file
@@ -1,24 +1,31 @@
 import os
 import re
 import copy
-import random
+import json
+import warnings
 import numpy as np
-from creatures import creature, evolution
+from creatures import creature, evolution, genome
+from creatures.arena import DNAArena
 
 
 class Population:
-    def __init__(self, population_size:int, default_gene_count:int = 5):
+    def __init__(self, population_size:int, default_gene_count:int = 5, rng:np.random.Generator = None):
         self.default_gene_count = default_gene_count
         self.population_size = population_size
         self.creatures = []
         self.max_dist = 1
         self.min_dist = 0
         self.avg_dist = 0
-        self.reset_population()
+        self.n_repaired = 0
+        self.arena = None
+        self.back_arena = None
+        self.parents = None
+        self.reset_population(rng = rng)
 
-    def reset_population(self, creatures:list[creature.Creature] = None):
+    def reset_population(self, creatures:list[creature.Creature] = None, rng:np.random.Generator = None):
         if creatures == None:
-            self.creatures = [creature.Creature(self.default_gene_count) for _ in range(self.population_size)]
+            rng = np.random.default_rng() if rng is None else rng
+            self.creatures = [creature.Creature(self.default_gene_count, rng) for _ in range(self.population_size)]
         else:
             assert type(creatures) == list
             assert type(creatures[0]) == creature.Creature
@@ -26,14 +33,26 @@ class Population:
                 del old_creature
             self.creatures = creatures
             self.population_size = len(self.creatures)
+        # (parent1, parent2) indices in the previous generation, -1 for none
+        self.parents = np.full((len(self.creatures), 2), -1)
+        # fresh buffers, as creatures outside the population may still view the old ones
+        self.arena = None
+        self.back_arena = None
+        self.sync_arena()
+
+    def sync_arena(self):
+        self.arena = Population.__fill_arena(self.arena, self.creatures)
+        return self.arena
 
     def add_creature(self, cr:creature.Creature):
         self.creatures.append(cr)
         self.population_size = len(self.creatures)
+        self.parents = np.concatenate((self.parents, np.full((1, 2), -1)))
 
     def add_creatures(self, creatures:list[creature.Creature]):
         self.creatures.extend(creatures)
         self.population_size = len(self.creatures)
+        self.parents = np.concatenate((self.parents, np.full((len(creatures), 2), -1)))
 
     def to_csvs(self, base_folder = ".", identifier = "dna"):
         Population.__to_csvs(self.creatures, base_folder = base_folder, identifier = identifier)
@@ -42,17 +61,69 @@ class Population:
         new_creatures = Population.__from_csvs(base_folder = base_folder, identifier = identifier)
         self.reset_population(new_creatures)
 
+    def to_checkpoint(self, path:str, generation:int = 0, state:dict = None):
+        Population.write_checkpoint(path, self.get_snapshot(), generation, state)
+
+    def from_checkpoint(self, path:str):
+        new_creatures, generation, state = Population.__from_checkpoint(path)
+        self.reset_population(new_creatures)
+        return generation, state
+
     def fittest_to_csvs(self, n_fittest = 3, base_folder = ".", identifier = "dna"):
         fits = evolution.Selection.eval_fitness(self.creatures)
         fittest_ids = fits.argsort()[-n_fittest:][::-1] 
         fittest_crs = [self.creatures[id] for id in fittest_ids]
         Population.__to_csvs(fittest_crs, base_folder = base_folder, identifier = identifier)
 
+    def get_report(self):
+        # metrics of every creature, in the order of `generate_report`
+        return Population.__report(self.creatures, self.parents)
+
+    def get_snapshot(self):
+        return Population.__snapshot(self.creatures, self.parents)
+
+    def get_migrants(self, num_of_migrants:int):
+        # the fittest evaluated creatures as plain arrays, to be sent to
+        # another population with `add_migrants`
+        assert 0 < num_of_migrants and num_of_migrants <= len(self.creatures)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            fits = evolution.Selection.eval_fitness(self.creatures)
+        migrants = [self.creatures[i] for i in np.argsort(-fits, kind = "stable")[:num_of_migrants]]
+        lengths = np.array([len(cr.dna) for cr in migrants])
+        dna = np.zeros((len(migrants), np.max(lengths), migrants[0].dna.shape[-1]))
+        for i, cr in enumerate(migrants):
+            dna[i, :lengths[i]] = cr.dna
+        return {
+            "dna": dna,
+            "lengths": lengths,
+            "start_positions": np.array([cr.start_position for cr in migrants], dtype = np.float64),
+            "last_positions": np.array([cr.last_position for cr in migrants], dtype = np.float64),
+        }
+
+    def add_migrants(self, migrants:dict):
+        # migrants replace the least fit creatures and keep the positions they
+        # were evaluated at, so they compete in the next selection right away
+        num_of_migrants = len(migrants["lengths"])
+        assert num_of_migrants <= len(self.creatures)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            fits = evolution.Selection.eval_fitness(self.creatures)
+        for i, index in enumerate(np.argsort(fits, kind = "stable")[:num_of_migrants]):
+            new_cr = creature.Creature(1)
+            new_cr.update_dna(np.array(migrants["dna"][i, :migrants["lengths"][i]]))
+            new_cr.reset_start_position(tuple(migrants["start_positions"][i].tolist()))
+            new_cr.update_position(tuple(migrants["last_positions"][i].tolist()))
+            Population.__detach([self.creatures[index]])
+            self.creatures[index] = new_cr
+            self.parents[index] = -1
+
     def generate_report(self, generation, base_folder = ".tmp"):
-        n_exp_link  = [len(cr.get_expanded_links()) for cr in self.creatures]
-        n_flat_link = [len(cr.get_flat_links()) for cr in self.creatures]
-        dists = [cr.get_distance() for cr in self.creatures]
-        fits  = list(evolution.Selection.eval_fitness(self.creatures))
+        report = self.get_report()
+        n_exp_link  = report["n_exp_links"].tolist()
+        n_flat_link = report["n_flat_links"].tolist()
+        dists = report["distances"].tolist()
+        fits  = report["fitness"].tolist()
 
         file_names = [
             f"{generation}_n_exp_links.csv",
@@ -74,7 +145,9 @@ class Population:
                        mutation_freq:float = 0.1,
                        mutation_amnt:float = 0.1,
                        max_growth_rt:float = 1.2,
-                       dist_limit_rt:float = 1.2):
+                       dist_limit_rt:float = 1.2,
+                       rng:np.random.Generator = None,
+                       screen = None):
         assert num_of_elites < self.population_size
         assert num_of_random < self.population_size
         assert num_of_elites + num_of_random < self.population_size
@@ -82,10 +155,12 @@ class Population:
         assert 0 <= max_growth_rt
         assert 0 <= mutation_freq and mutation_freq <= 1
         assert 0 <= mutation_amnt and mutation_amnt <= 1
+        rng = np.random.default_rng() if rng is None else rng
         
         # upper limit for extended links
-        max_expanded_length = np.max([len(cr.get_expanded_links()) for cr in self.creatures])
-        max_expanded_length = max_expanded_length * (max_growth_rt)
+        arena = self.sync_arena()
+        n_exp_links = genome.Genome.count_expanded_links(arena.dna[:len(self.creatures)], arena.lengths[:len(self.creatures)])
+        max_expanded_length = np.max(n_exp_links) * (max_growth_rt)
 
         # eliminate cheating creatures manually by incremental fit increase
         for cr in self.creatures:
@@ -103,32 +178,80 @@ class Population:
         fits = evolution.Selection.eval_fitness(self.creatures)
         fittest_indices = np.array(fits).argsort()[-1:-(num_of_elites+1):-1]
 
+        # a `screen` (such as `app.surrogate.SurrogateModel`) may ask for more
+        # candidates than children and pick the children among them
+        num_of_children = self.population_size - num_of_elites - num_of_random
+        num_of_candidates = num_of_children if screen is None else screen.get_num_candidates(num_of_children)
+        parent_pairs = evolution.Selection.select_parent_pairs(fits, num_of_candidates, rng)
+
+        # children are mated in one batch from the arena, and those over the
+        # expanded-size limit are trimmed rather than mated again; each one
+        # trimmed is a retry the rejection loop would have needed at least
+        children, child_lengths = evolution.BatchMating.mate(
+            dna = arena.dna,
+            lengths = arena.lengths,
+            parents1 = parent_pairs[:, 0],
+            parents2 = parent_pairs[:, 1],
+            min_length = min_length,
+            max_length = max_length,
+            max_growth_rt = max_growth_rt,
+            mutation_freq = mutation_freq,
+            mutation_amnt = mutation_amnt,
+            rng = rng
+        )
+        children, child_lengths, repaired = evolution.BatchMating.trim_expanded(children, child_lengths, max_expanded_length, min_length)
+        self.n_repaired = int(np.sum(repaired))
+        if screen is not None:
+            selected = screen.select(children, child_lengths, num_of_children, rng)
+            children, child_lengths, parent_pairs = children[selected], child_lengths[selected], parent_pairs[selected]
+
         new_creatures = []
-        for _ in range(self.population_size - num_of_elites - num_of_random):
-            fits = evolution.Selection.eval_fitness(self.creatures)
-            p1, p2 = evolution.Selection.select_parents(self.creatures, fits)
-            new_cr = None
-            while new_cr is None or len(new_cr.get_expanded_links()) > max_expanded_length:
-                new_cr = creature.Creature(1)
-                new_cr.update_dna(evolution.Mating.mate(
-                    dna1 = p1.dna,
-                    dna2 = p2.dna,
-                    min_length = min_length,
-                    max_length = max_length,
-                    max_growth_rt = max_growth_rt,
-                    mutation_freq = mutation_freq,
-                    mutation_amnt = mutation_amnt
-                ))
+        for dna, length in zip(children, child_lengths):
+            new_cr = creature.Creature(1)
+            new_cr.update_dna(dna[:length])
             new_creatures.append(new_cr)
+        new_parents = [(ind_parent1, ind_parent2) for ind_parent1, ind_parent2 in parent_pairs]
         for index in fittest_indices:
             new_cr = copy.copy(self.creatures[index])
             new_creatures.append(new_cr)
+            new_parents.append((index, -1))
         for _ in range(num_of_random):
-            new_cr = creature.Creature(1)
-            new_cr = copy.copy(random.choice(self.creatures))
+            index = rng.integers(len(self.creatures))
+            new_cr = copy.copy(self.creatures[index])
             new_creatures.append(new_cr)
+            new_parents.append((index, -1))
 
-        self.reset_population(new_creatures)
+        # the next generation is written into the back buffer while the current
+        # one is still read, then the two swap; the creatures left behind get
+        # their own genomes, as their slots are written again next generation
+        self.back_arena = Population.__fill_arena(self.back_arena, new_creatures, max_length)
+        self.arena, self.back_arena = self.back_arena, self.arena
+        Population.__detach(self.creatures)
+        self.creatures = new_creatures
+        self.parents = np.array(new_parents, dtype = int).reshape(-1, 2)
+
+    @staticmethod
+    def __fill_arena(arena:DNAArena, creatures:list[creature.Creature], max_length:int = 0):
+        # copy every genome that is not in its slot yet and make `Creature.dna`
+        # a view of that slot; copies are taken first since a slot may be
+        # what another creature is viewing
+        if len(creatures) == 0:
+            return arena
+        max_length = max(max_length, max(len(cr.dna) for cr in creatures))
+        gene_size = creatures[0].dna.shape[-1]
+        if arena is None or not arena.fits(len(creatures), max_length) or arena.gene_size != gene_size:
+            arena = DNAArena(len(creatures), max_length, gene_size)
+        pending = [(i, np.array(cr.dna)) for i, cr in enumerate(creatures) if not arena.holds(i, cr.dna)]
+        for i, dna in pending:
+            creatures[i].dna = arena.write(i, dna)
+        return arena
+
+    @staticmethod
+    def __detach(creatures:list[creature.Creature]):
+        # creatures leaving the population copy their genome out of the arena,
+        # so a slot written again later does not change them
+        for cr in creatures:
+            cr.dna = np.array(cr.dna)
 
     @staticmethod
     def __generate_report_csv(csv_file_name, csv_rows, base_folder = ".tmp"):
@@ -143,6 +266,83 @@ class Population:
         for i, cr in enumerate(creatures):
             np.savetxt(f"{base_folder}/{identifier}_cr_{i:04}.csv", cr.dna, delimiter = ",")
 
+    @staticmethod
+    def csvs_to_checkpoint(base_folder:str, path:str, identifier:str = "dna", generation:int = 0, state:dict = None):
+        # converts a folder written by `to_csvs` into a single checkpoint file
+        creatures = Population.__from_csvs(base_folder = base_folder, identifier = identifier)
+        Population.write_checkpoint(path, Population.__snapshot(creatures), generation, state)
+
+    @staticmethod
+    def write_checkpoint(path:str, snapshot:dict, generation:int = 0, state:dict = None):
+        # one uncompressed .npz: every genome stacked into a single float64
+        # matrix with a length vector to split it, positions, fitness,
+        # the generation and a JSON `state` for anything else worth keeping.
+        # It is written next to `path` and moved over it, so an interrupted
+        # save never leaves a partial checkpoint behind
+        dirname = os.path.dirname(path)
+        if dirname != "" and not os.path.exists(dirname):
+            os.makedirs(dirname, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f,
+                     dna = snapshot["dna"],
+                     lengths = snapshot["lengths"],
+                     start_positions = snapshot["start_positions"],
+                     last_positions = snapshot["last_positions"],
+                     fitness = snapshot["fitness"],
+                     generation = generation,
+                     state = json.dumps({} if state is None else state))
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def __report(creatures, parents = None):
+        link_stats = creature.Creature.compute_population_stats(creatures)
+        return {
+            "n_exp_links": link_stats["n_exp_links"],
+            "n_flat_links": np.array([len(cr.dna) for cr in creatures]),
+            "depth": link_stats["depth"],
+            "max_fanout": link_stats["max_fanout"],
+            "mass": link_stats["mass"],
+            "distances": np.array([cr.get_distance() for cr in creatures]),
+            "fitness": np.asarray(evolution.Selection.eval_fitness(creatures), dtype = np.float64),
+            "parents": np.full((len(creatures), 2), -1) if parents is None else np.array(parents),
+        }
+
+    @staticmethod
+    def __snapshot(creatures, parents = None):
+        # read-only copies of everything written out about a generation, so
+        # they can be written on another thread while the creatures change
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            snapshot = Population.__report(creatures, parents)
+        snapshot["dna"] = np.concatenate([cr.dna for cr in creatures])
+        snapshot["lengths"] = np.array([len(cr.dna) for cr in creatures])
+        snapshot["start_positions"] = np.array([cr.start_position for cr in creatures], dtype = np.float64)
+        snapshot["last_positions"] = np.array([cr.last_position for cr in creatures], dtype = np.float64)
+        for value in snapshot.values():
+            value.flags.writeable = False
+        return snapshot
+
+    @staticmethod
+    def __from_checkpoint(path:str):
+        assert os.path.exists(path)
+        with np.load(path) as data:
+            dna = data["dna"]
+            lengths = data["lengths"]
+            start_positions = data["start_positions"].tolist()
+            last_positions = data["last_positions"].tolist()
+            generation = int(data["generation"])
+            state = json.loads(str(data["state"]))
+        ends = np.cumsum(lengths)
+        new_creatures = []
+        for i, (length, end) in enumerate(zip(lengths, ends)):
+            cr = creature.Creature(1)
+            cr.update_dna(dna[end - length:end])
+            cr.reset_start_position(tuple(start_positions[i]))
+            cr.update_position(tuple(last_positions[i]))
+            new_creatures.append(cr)
+        return new_creatures, generation, state
+
     @staticmethod
     def __from_csvs(base_folder = ".tmp", identifier = "dna"):
         assert os.path.exists(base_folder)
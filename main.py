@@ -1,8 +1,19 @@
 from app.app import MainApp
+from app.stopping import StoppingPolicy
+from app.surrogate import SurrogateModel
 
 # simulation parameters
 BASE_DIR = ".sim"
+SEED = 1994
 NUM_OF_PROCESSES = 8
+WORLD_MODE = "persistent"
+BATCH_SIZE = 1 # creatures sharing one physics world; batched results differ from solo runs
+CACHE_SIZE = 1024
+EARLY_STOPPING = False # ends still or settled runs early; changes the fitness slightly
+STILL_SPEED = 0.02
+SETTLE_DISTANCE = 0.05
+SAMPLE_EVERY = 10
+SURROGATE_MODEL = None # "ridge" or "knn" to pre-screen children
 MAX_SIM_FRAMES = 2400
 SAVE_EACH = 2500
 REPORT_EACH = 50
@@ -23,9 +34,16 @@ DIST_LIMIT_RT = 1.25
 INCREMENTAL = True
 
 # instantiate simulator app
-main = MainApp(
+with MainApp(
     base_dir  = BASE_DIR,
+    seed = SEED,
     pool_size = NUM_OF_PROCESSES,
+    world_mode = WORLD_MODE,
+    batch_size = BATCH_SIZE,
+    cache_size = CACHE_SIZE,
+    stopping = StoppingPolicy(still_speed = STILL_SPEED, settle_distance = SETTLE_DISTANCE) if EARLY_STOPPING else None,
+    sample_every = SAMPLE_EVERY,
+    surrogate = None if SURROGATE_MODEL is None else SurrogateModel(SURROGATE_MODEL),
     max_frame = MAX_SIM_FRAMES,
     incremental = INCREMENTAL,
     population_size = NUM_OF_CR,
@@ -39,15 +57,14 @@ main = MainApp(
     max_growth_rt = MAX_GROWTH_RT,
     dist_limit_rt = DIST_LIMIT_RT,
     load_progress = True
-)
-
-# run app
-main.run(
-    save_each    = SAVE_EACH,
-    save_after   = True,
-    report_each  = REPORT_EACH,
-    report_after = True,
-    log_each     = LOG_EACH,
-    log_after    = True,
-    log_console  = True
-)
\ No newline at end of file
+) as main:
+    # run app
+    main.run(
+        save_each    = SAVE_EACH,
+        save_after   = True,
+        report_each  = REPORT_EACH,
+        report_after = True,
+        log_each     = LOG_EACH,
+        log_after    = True,
+        log_console  = True
+    )
\ No newline at end of file
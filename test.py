@@ -5,7 +5,14 @@ from test.test_creature import *
 from test.test_population import *
 from test.test_evolution import *
 from test.test_simulator import *
+from test.test_cache import *
+from test.test_stopping import *
+from test.test_surrogate import *
+from test.test_history import *
+from test.test_writer import *
+from test.test_arena import *
 from test.test_execution import *
 from test.test_mainapp import *
+from test.test_islands import *
 
 unittest.main()
\ No newline at end of file
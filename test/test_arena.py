@@ -0,0 +1,133 @@
+import sys
+import pickle
+import unittest
+import subprocess
+import numpy as np
+from multiprocessing import shared_memory
+from app import simulator
+from creatures import arena, creature, genome, population
+
+class DNAArenaTest(unittest.TestCase):
+    def testWriteRead(self):
+        self.assertIsNotNone(arena.DNAArena)
+
+        gene_size = len(genome.Genome.get_spec())
+        dna_arena = arena.DNAArena(3, 4, gene_size)
+        self.assertEqual(len(dna_arena), 3)
+        self.assertTrue(dna_arena.fits(3, 4))
+        self.assertFalse(dna_arena.fits(3, 5))
+
+        dna = genome.Genome.init_genome(2)
+        view = dna_arena.write(1, dna)
+        self.assertTrue(np.array_equal(view, dna))
+        self.assertTrue(np.array_equal(dna_arena.read(1), dna))
+        self.assertTrue(dna_arena.holds(1, view))
+        self.assertFalse(dna_arena.holds(1, dna))
+        self.assertEqual(len(dna_arena.read(0)), 0)
+        with self.assertRaises(AssertionError):
+            dna_arena.write(0, genome.Genome.init_genome(5))
+
+        # another handle sees the same memory
+        attached = arena.DNAArena.attach(dna_arena.name)
+        self.assertEqual((attached.capacity, attached.max_length, attached.gene_size), (3, 4, gene_size))
+        self.assertTrue(np.array_equal(attached.read(1), dna))
+        dna_arena.write(1, dna[:1])
+        self.assertTrue(np.array_equal(attached.read(1), dna[:1]))
+
+    def testViewOutlivesArena(self):
+        # a genome view keeps the segment open after the arena is gone, and the
+        # segment is removed with the last view
+        gene_size = len(genome.Genome.get_spec())
+        dna_arena = arena.DNAArena(2, 3, gene_size)
+        name = dna_arena.name
+        dna = genome.Genome.init_genome(3)
+        view = dna_arena.write(0, dna)
+        del dna_arena
+        self.assertTrue(np.array_equal(view, dna))
+        shared_memory.SharedMemory(name = name).close()
+        del view
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name = name)
+
+    def testPopulationArena(self):
+        pop = population.Population(6, 3)
+        dna_arena = pop.sync_arena()
+        self.assertIs(pop.arena, dna_arena)
+        for i, cr in enumerate(pop.creatures):
+            self.assertTrue(dna_arena.holds(i, cr.dna))
+
+        # a creature added later is copied into a larger arena on sync
+        cr = creature.Creature(4)
+        dna = cr.dna.copy()
+        pop.add_creature(cr)
+        dna_arena = pop.sync_arena()
+        self.assertEqual(len(dna_arena), 7)
+        self.assertTrue(np.array_equal(cr.dna, dna))
+        self.assertTrue(dna_arena.holds(6, cr.dna))
+
+        # the next generation goes to the back buffer and the buffers swap;
+        # both are sized for `max_length` after the first generation
+        pop.new_generation()
+        front = pop.arena
+        pop.new_generation()
+        self.assertIsNot(pop.arena, front)
+        self.assertIs(pop.back_arena, front)
+        for i, cr in enumerate(pop.creatures):
+            self.assertTrue(pop.arena.holds(i, cr.dna))
+        back = pop.arena
+        pop.new_generation()
+        self.assertIs(pop.arena, front)
+        self.assertIs(pop.back_arena, back)
+
+        # creatures that leave the population keep their genomes, although
+        # their slots are written again
+        held = pop.creatures[0]
+        dna = held.dna.copy()
+        for _ in range(3):
+            pop.new_generation()
+        self.assertTrue(np.array_equal(held.dna, dna))
+        evicted = pop.creatures[1]
+        pop.creatures[1].update_position((0, 0, 0))
+        for cr in pop.creatures[:1] + pop.creatures[2:]:
+            cr.update_position((1, 0, 0))
+        dna = evicted.dna.copy()
+        pop.add_migrants(pop.get_migrants(1))
+        self.assertIsNot(pop.creatures[1], evicted)
+        pop.sync_arena()
+        self.assertTrue(np.array_equal(evicted.dna, dna))
+
+        # creatures are pickled with their own copy of the genome
+        cr = pickle.loads(pickle.dumps(pop.creatures[0]))
+        self.assertTrue(np.array_equal(cr.dna, pop.creatures[0].dna))
+
+    def testMultiSimulatorArena(self):
+        pop = population.Population(6, 3)
+        dnas = [cr.dna.copy() for cr in pop.creatures]
+        with simulator.Simulator() as sim:
+            sim.eval_population(pop, 240)
+            positions = [cr.last_position for cr in pop.creatures]
+
+        with simulator.MultiSimulator(2) as sim:
+            for _ in range(2):
+                sim.eval_population(pop, 240)
+                self.assertEqual([cr.last_position for cr in pop.creatures], positions)
+        for cr, dna in zip(pop.creatures, dnas):
+            self.assertTrue(np.array_equal(cr.dna, dna))
+
+    def testMultiSimulatorBeforePopulation(self):
+        # workers started before the first arena exists must not unlink it when
+        # they exit; a fresh interpreter has no resource tracker running yet
+        script = "\n".join([
+            "from app import simulator",
+            "from creatures import population",
+            "sim = simulator.MultiSimulator(2)",
+            "pop = population.Population(4, 3)",
+            "sim.eval_population(pop, 240)",
+            "sim.close()",
+            "sim = simulator.MultiSimulator(2)",
+            "sim.eval_population(pop, 240)",
+            "sim.close()",
+        ])
+        result = subprocess.run([sys.executable, "-c", script], capture_output = True, text = True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertNotIn("leaked", result.stderr)
@@ -0,0 +1,79 @@
+import unittest
+import numpy as np
+from app import cache, simulator
+from creatures import creature, genome, population
+
+class FitnessCacheTest(unittest.TestCase):
+    def testCacheKey(self):
+        self.assertIsNotNone(cache.FitnessCache.get_key)
+
+        dna = genome.Genome.init_genome(5)
+        self.assertEqual(cache.FitnessCache.get_key(dna, 100), cache.FitnessCache.get_key(dna.copy(), 100))
+        self.assertNotEqual(cache.FitnessCache.get_key(dna, 100), cache.FitnessCache.get_key(dna, 200))
+        self.assertNotEqual(cache.FitnessCache.get_key(dna, 100), cache.FitnessCache.get_key(dna, 100, (1,)))
+
+        mutated_dna = dna.copy()
+        mutated_dna[0][0] = np.nextafter(mutated_dna[0][0], 1)
+        self.assertNotEqual(cache.FitnessCache.get_key(dna, 100), cache.FitnessCache.get_key(mutated_dna, 100))
+
+    def testCacheEviction(self):
+        fit_cache = cache.FitnessCache(3)
+        for i in range(3):
+            fit_cache.put(i, (i, 0, 0))
+        self.assertEqual(len(fit_cache), 3)
+
+        # touching the oldest entry makes the second oldest the one to evict
+        self.assertEqual(fit_cache.get(0), (0, 0, 0))
+        fit_cache.put(3, (3, 0, 0))
+        self.assertEqual(len(fit_cache), 3)
+        self.assertIn(0, fit_cache)
+        self.assertNotIn(1, fit_cache)
+        self.assertIsNone(fit_cache.get(1))
+
+        self.assertEqual(fit_cache.hits, 1)
+        self.assertEqual(fit_cache.misses, 1)
+        self.assertEqual(fit_cache.get_hit_rate(), 0.5)
+
+        fit_cache.clear()
+        self.assertEqual(len(fit_cache), 0)
+        self.assertEqual(fit_cache.hits, 0)
+
+    def testSimulatorCache(self):
+        pop = population.Population(4, 3)
+        pop.add_creature(pop.creatures[0])
+
+        sim = simulator.Simulator(cache_size = 16)
+        sim.eval_population(pop, 240)
+        self.assertEqual(sim.cache.misses, 4)
+        self.assertEqual(sim.cache.hits, 1)
+        self.assertEqual(sim.simulated, [0, 1, 2, 3])
+
+        dists1 = [cr.get_distance() for cr in pop.creatures]
+        for cr in pop.creatures:
+            cr.update_position((0, 0, 0))
+        sim.eval_population(pop, 240)
+        dists2 = [cr.get_distance() for cr in pop.creatures]
+        self.assertEqual(sim.cache.hits, 6)
+        self.assertEqual(dists1, dists2)
+
+        # cached results are the same as simulated ones
+        uncached_sim = simulator.Simulator()
+        uncached_sim.eval_population(pop, 240)
+        self.assertEqual(dists1, [cr.get_distance() for cr in pop.creatures])
+        sim.close()
+        uncached_sim.close()
+
+    def testMultiSimulatorCache(self):
+        pop = population.Population(6, 3)
+        with simulator.MultiSimulator(2, cache_size = 16) as sim:
+            sim.eval_population(pop, 240)
+            dists1 = [cr.get_distance() for cr in pop.creatures]
+            self.assertEqual(sim.cache.misses, 6)
+
+            pop.add_creature(creature.Creature(3))
+            sim.eval_population(pop, 240)
+            dists2 = [cr.get_distance() for cr in pop.creatures]
+            self.assertEqual(sim.cache.hits, 6)
+            self.assertEqual(sim.cache.misses, 7)
+            self.assertEqual(sim.simulated, [6])
+            self.assertEqual(dists1, dists2[:6])
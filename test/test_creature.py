@@ -1,6 +1,8 @@
 import os
+import pickle
 import unittest
-from creatures import creature, genome
+import numpy as np
+from creatures import creature, genome, phenotype
 from xml.dom.minidom import Element
 
 class CreatureLinksTest(unittest.TestCase):
@@ -42,6 +44,40 @@ class CreatureLinksTest(unittest.TestCase):
         for i, link in enumerate(exp_links):
             self.assertTrue(link.name.endswith(str(i)))
         
+    def testCreatureExpandedLinksNamePrefix(self):
+        # Link_1 must not be mistaken for the parent of Link_10's children
+        flat_links = [creature.CreatureLink("Link_0", None, "None", 1)]
+        flat_links += [creature.CreatureLink(f"Link_{i}", None, "Link_0", 1) for i in range(1, 11)]
+        flat_links[10].recur = 3
+        flat_links.append(creature.CreatureLink("Link_11", None, "Link_1", 2))
+
+        exp_links = creature.Creature.expand_links(flat_links)
+        self.assertEqual(len(exp_links), 1 + 9 + 3 + 2)
+        self.assertEqual(exp_links[-1].parent_name, "Link_1_0__ID_1")
+        self.assertEqual(exp_links[-2].parent_name, "Link_1_0__ID_1")
+
+    def testCreatureLinkArrays(self):
+        self.assertIsNotNone(creature.Creature.expand_indices)
+        self.assertIsNotNone(creature.Creature.get_link_arrays)
+
+        parents, genes, siblings = creature.Creature.expand_indices(np.array([-1, 0, 0, 1, 1]),
+                                                                    np.array([1, 3, 1, 1, 2]))
+        self.assertEqual(list(parents), [-1, 0, 0, 0, 0, 1, 2, 3, 1, 1, 2, 2, 3, 3])
+        self.assertEqual(list(genes), [0, 1, 1, 1, 2, 3, 3, 3, 4, 4, 4, 4, 4, 4])
+        self.assertEqual(list(siblings), [0, 0, 1, 2, 0, 0, 0, 0, 0, 1, 0, 1, 0, 1])
+
+        for _ in range(10):
+            cr = creature.Creature(8)
+            flat_links = cr.get_flat_links()
+            exp_links = cr.get_expanded_links()
+            parents, genes, siblings = cr.get_link_arrays()
+            self.assertEqual(len(parents), len(exp_links))
+            for i, link in enumerate(exp_links):
+                self.assertTrue(link.name.startswith(flat_links[genes[i]].name + "_"))
+                if i > 0:
+                    self.assertEqual(link.parent_name, exp_links[parents[i]].name)
+                    self.assertEqual(int(link.name.split("_")[2]), siblings[i])
+
     def testCreatureExpandedLinksExtensive(self):
         self.assertIsNotNone(creature.Creature.expand_links)
         self.assertIsNotNone(creature.Creature.get_expanded_links)
@@ -97,6 +133,59 @@ class CreatureLinksTest(unittest.TestCase):
             self.assertEqual(exp_links_count, len(exp_links))
             self.assertGreaterEqual(len(exp_links), len(flat_links))
 
+    def testCreaturePickle(self):
+        cr = creature.Creature(8)
+        cr.update_position((1, 2, 3))
+        exp_links = cr.get_expanded_links()
+        motors = cr.get_motors()
+        self.assertFalse(hasattr(exp_links[0], "__dict__"))
+        self.assertFalse(hasattr(motors[0], "__dict__") if len(motors) > 0 else False)
+
+        cr_copy = pickle.loads(pickle.dumps(cr))
+        self.assertTrue((cr_copy.dna == cr.dna).all())
+        self.assertEqual(cr_copy.last_position, cr.last_position)
+        self.assertEqual(cr_copy.get_urdf(), cr.get_urdf())
+        self.assertEqual([link.name for link in cr_copy.get_expanded_links()], [link.name for link in exp_links])
+        self.assertEqual(len(cr_copy.get_motors()), len(motors))
+
+    def testCreatureMotorBank(self):
+        self.assertIsNotNone(creature.Creature.get_motor_bank)
+
+        for _ in range(10):
+            cr = creature.Creature(6)
+            motors = cr.get_motors()
+            bank = cr.get_motor_bank()
+            self.assertEqual(len(bank), len(cr.get_expanded_links()) - 1)
+            for _ in range(10):
+                self.assertTrue((bank() == np.array([m() for m in motors])).all())
+
+            cr.reset_motors()
+            self.assertIsNot(cr.get_motor_bank(), bank)
+            self.assertTrue((cr.get_motor_bank().phases == 0).all())
+
+    def testCreatureLinkStats(self):
+        self.assertIsNotNone(creature.Creature.get_link_stats)
+
+        creatures = [creature.Creature(n) for n in (1, 2, 4, 6, 8, 8)]
+        for cr in creatures:
+            exp_links = cr.get_expanded_links()
+            exp_parents, _, _ = cr.get_link_arrays()
+            depths = [0]
+            for parent in exp_parents[1:]:
+                depths.append(depths[parent] + 1)
+            masses = [float(phenotype.BodyPart.body_part_attrs(link.name, link.g_dict)["mass"]) for link in exp_links]
+
+            stats = cr.get_link_stats()
+            self.assertEqual(stats["n_exp_links"], len(exp_links))
+            self.assertEqual(stats["depth"], max(depths))
+            self.assertEqual(stats["max_fanout"], np.max(np.bincount(exp_parents[1:], minlength = 1)))
+            self.assertAlmostEqual(stats["mass"], sum(masses))
+
+        # the population batch gives the same statistics
+        batch_stats = creature.Creature.compute_population_stats(creatures)
+        for key in ("n_exp_links", "depth", "max_fanout", "mass"):
+            self.assertTrue(np.allclose(batch_stats[key], [cr.get_link_stats()[key] for cr in creatures]))
+
 class CreatureXMLTest(unittest.TestCase):
 
     def testCreatureXML(self):
@@ -118,6 +207,16 @@ class CreatureXMLTest(unittest.TestCase):
         self.assertEqual(f_str, cr.get_xml().toprettyxml())
         os.remove(file_path)
 
+    def testCreatureURDFString(self):
+        self.assertIsNotNone(creature.Creature.get_urdf)
+
+        for gene_count in range(1, 10):
+            cr = creature.Creature(gene_count)
+            robot_tag = cr.get_xml()
+            self.assertEqual(cr.get_urdf(), robot_tag.toprettyxml())
+            self.assertEqual(cr.get_urdf(pretty = False), robot_tag.toxml())
+            self.assertEqual(cr.get_urdf("other"), cr.get_xml("other").toprettyxml())
+
 class CreatureMoveTest(unittest.TestCase):
     def testMovingDistance(self):
         self.assertIsNotNone(creature.Creature.update_position)
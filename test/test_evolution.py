@@ -60,6 +60,20 @@ class SelectionTest(unittest.TestCase):
             self.assertIn(p2, parents)
             self.assertNotEqual(p1, p2)
         
+    def testParentPairSelection(self):
+        self.assertIsNotNone(evolution.Selection.select_parent_pairs)
+        fits = np.array([1, 0, 3, 2, 5, 0.5])
+        num_of_pairs = 20000
+
+        pairs = evolution.Selection.select_parent_pairs(fits, num_of_pairs)
+        self.assertEqual(pairs.shape, (num_of_pairs, 2))
+        self.assertTrue((pairs[:, 0] != pairs[:, 1]).all())
+        self.assertTrue((pairs != 1).all())
+
+        # first parents follow the fitness proportions
+        freqs = np.bincount(pairs[:, 0], minlength = len(fits)) / num_of_pairs
+        self.assertTrue(np.allclose(freqs, fits / np.sum(fits), atol = 0.02))
+        
 class MutationTest(unittest.TestCase):
     def testMutationClass(self):
         self.assertIsNotNone(evolution.Mutation)
@@ -167,3 +181,100 @@ class MatingTest(unittest.TestCase):
             self.assertEqual(child_genome.shape[1], genomes[0].shape[1])
             self.assertGreaterEqual(child_genome.shape[0], min_length)
             self.assertLessEqual(child_genome.shape[0], max_length)
+
+    def testSeededOperators(self):
+        dna1 = genome.Genome.init_genome(6, np.random.default_rng(0))
+        dna2 = genome.Genome.init_genome(6, np.random.default_rng(0))
+        self.assertTrue((dna1 == dna2).all())
+
+        children = []
+        for _ in range(2):
+            rng = np.random.default_rng(1)
+            pairs = evolution.Selection.select_parent_pairs(np.arange(1, 6), 3, rng)
+            child = evolution.Mating.mate(dna1, dna2, 2, 10, 1.5, 0.25, 0.25, rng)
+            children.append((pairs, child))
+        self.assertTrue((children[0][0] == children[1][0]).all())
+        self.assertTrue((children[0][1] == children[1][1]).all())
+
+class BatchMatingTest(unittest.TestCase):
+    def setUp(self):
+        self.genomes = [genome.Genome.init_genome(n) for n in (3, 5, 8, 10)]
+        self.lengths = np.array([len(dna) for dna in self.genomes])
+        self.dna = np.zeros((len(self.genomes), 10, self.genomes[0].shape[1]))
+        for i, dna in enumerate(self.genomes):
+            self.dna[i, :len(dna)] = dna
+
+    def testBatchMatingClass(self):
+        self.assertIsNotNone(evolution.BatchMating)
+        self.assertIsNotNone(evolution.BatchMating.mate)
+        self.assertIsNotNone(evolution.BatchMating.mate_segments)
+
+    def testBatchMatingCreatures(self):
+        min_length = 2
+        max_length = 10
+        parents = np.random.choice(len(self.genomes), size = (50, 2))
+        children, lengths = evolution.BatchMating.mate(self.dna, self.lengths, parents[:, 0], parents[:, 1],
+                                                       min_length, max_length, 1.5, 0.15, 0.15)
+        self.assertIsInstance(children, np.ndarray)
+        self.assertEqual(len(children.shape), 3)
+        self.assertEqual(children.shape[0], len(parents))
+        self.assertEqual(children.shape[1], np.max(lengths))
+        self.assertEqual(children.shape[2], self.dna.shape[2])
+        self.assertEqual(np.mean(lengths >= min_length), 1)
+        self.assertEqual(np.mean(lengths <= max_length), 1)
+        for child, length in zip(children, lengths):
+            self.assertTrue((child[length:] == 0).all())
+            self.assertEqual(np.mean((child[:length] > 0) & (child[:length] < 1)), 1)
+
+    def testBatchMatingWithoutMutation(self):
+        # every row of a child is a row of one of its parents
+        parents = np.random.choice(len(self.genomes), size = (50, 2))
+        children, lengths = evolution.BatchMating.mate(self.dna, self.lengths, parents[:, 0], parents[:, 1],
+                                                       2, 10, 1.5, 0, 0)
+        for (p1, p2), child, length in zip(parents, children, lengths):
+            rows = np.concatenate((self.genomes[p1], self.genomes[p2]))
+            for row in child[:length]:
+                self.assertTrue((rows == row).all(axis = 1).any())
+
+    def testBatchMutation(self):
+        children, lengths = self.dna.copy(), self.lengths.copy()
+        shrunk, shrunk_lengths = evolution.BatchMating.mutate_shrink(children, lengths, 1, 2)
+        self.assertTrue((shrunk_lengths == 2).all())
+        self.assertTrue((shrunk[:, :2] == children[:, :2]).all())
+
+        grown, grown_lengths = evolution.BatchMating.mutate_grow(children, lengths, 1, 12)
+        self.assertTrue((grown_lengths == np.minimum(2 * lengths, 12)).all())
+        for child, grown_child, length in zip(children, grown, lengths):
+            self.assertTrue((grown_child[:length] == child[:length]).all())
+
+        mutated = evolution.BatchMating.mutate_point(children, lengths, 1, 0.1)
+        self.assertFalse((mutated[0, :lengths[0]] == children[0, :lengths[0]]).any())
+        self.assertTrue((mutated[0, lengths[0]:] == 0).all())
+
+    def testSeededBatchMating(self):
+        parents = np.array([[0, 1], [2, 3], [3, 0]])
+        results = [evolution.BatchMating.mate(self.dna, self.lengths, parents[:, 0], parents[:, 1],
+                                              2, 10, 1.5, 0.25, 0.25, np.random.default_rng(1))
+                   for _ in range(2)]
+        self.assertTrue((results[0][0] == results[1][0]).all())
+        self.assertTrue((results[0][1] == results[1][1]).all())
+
+    def testTrimExpanded(self):
+        children, lengths = self.dna.copy(), self.lengths.copy()
+        # every link recurs 5 times, so the largest creatures are far over the limit
+        children[:, :, genome.Genome.get_spec()["link_recurrence"]["index"]] = 0.99
+        max_expanded_length = 30
+        trimmed, trimmed_lengths, repaired = evolution.BatchMating.trim_expanded(children, lengths, max_expanded_length, 2)
+        counts = genome.Genome.count_expanded_links(children, lengths)
+        self.assertEqual(repaired.tolist(), (counts > max_expanded_length).tolist())
+        self.assertTrue((genome.Genome.count_expanded_links(trimmed, trimmed_lengths) <= max_expanded_length).all())
+        self.assertTrue((trimmed_lengths >= 2).all())
+        for child, trimmed_child, length in zip(children, trimmed, trimmed_lengths):
+            self.assertTrue((trimmed_child[:length] == child[:length]).all())
+            self.assertTrue((trimmed_child[length:] == 0).all())
+
+        # two genes at full recurrence do not fit, so their recurrences are lowered
+        trimmed, trimmed_lengths, repaired = evolution.BatchMating.trim_expanded(children, lengths, 3, 3)
+        self.assertTrue(repaired.all())
+        self.assertTrue((trimmed_lengths == 3).all())
+        self.assertTrue((genome.Genome.count_expanded_links(trimmed, trimmed_lengths) <= 3).all())
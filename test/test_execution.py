@@ -111,6 +111,13 @@ class SimulationRunTest(unittest.TestCase):
             self.assertEqual(pop1.creatures[i].get_xml().toprettyxml(), pop2.creatures[i].get_xml().toprettyxml())
             self.assertEqual(pop1.creatures[i].get_distance(), pop2.creatures[i].get_distance())
         
+        # a persistent physics world gives the same results as one reset per creature
+        sim3 = simulator.MultiSimulator(NUM_OF_PROCESSES, world_mode = "persistent")
+        sim3.eval_population(pop2, MAX_SIM_FRAMES)
+        for i in range(NUM_OF_CR):
+            self.assertEqual(pop1.creatures[i].get_distance(), pop2.creatures[i].get_distance())
+        sim3.close()
+
         # dists1 = [cr.get_distance() for cr in pop1.creatures]
         # dists2 = [cr.get_distance() for cr in pop2.creatures]
         
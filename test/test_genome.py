@@ -57,3 +57,46 @@ class GenotypeTest(unittest.TestCase):
             self.assertIsInstance(d["joint_type"], int)
             self.assertIsInstance(d["control_motor_type"], int)
 
+    def testGenotypeDecoding(self):
+        self.assertIsNotNone(genome.Genome.decode)
+
+        spec = genome.Genome.get_spec()
+        dna = genome.Genome.init_genome(10)
+        genes = genome.Genome.decode(dna)
+        self.assertEqual(genes.shape, (10,))
+        self.assertEqual(genes.dtype.names, tuple(spec.keys()))
+
+        for i in range(len(dna)):
+            for key in spec.keys():
+                value = dna[i][spec[key]["index"]] * spec[key]["scale"]
+                if spec[key]["type"] == "discrete":
+                    self.assertEqual(genes[key][i], int(value) + 1)
+                elif spec[key]["type"] == "categorical":
+                    self.assertEqual(genes[key][i], int(value))
+                else:
+                    self.assertEqual(genes[key][i], value)
+
+        # batches of genomes decode into the same values
+        batch = np.stack([genome.Genome.init_genome(4) for _ in range(3)])
+        batch_genes = genome.Genome.decode(batch)
+        self.assertEqual(batch_genes.shape, (3, 4))
+        for i in range(3):
+            self.assertTrue((batch_genes[i] == genome.Genome.decode(batch[i])).all())
+
+    def testExpandedLinkCount(self):
+        from creatures import creature
+        self.assertIsNotNone(genome.Genome.count_expanded_links)
+
+        genomes = [genome.Genome.init_genome(n) for n in (1, 2, 5, 8, 8)]
+        for dna in genomes:
+            flat_links = creature.Creature.genome_to_links(genome.Genome.to_dict(dna))
+            n_exp_links = len(creature.Creature.expand_links(flat_links))
+            self.assertEqual(genome.Genome.count_expanded_links(dna), n_exp_links)
+
+        # padded batches count only the first `lengths` genes
+        lengths = np.array([len(dna) for dna in genomes])
+        batch = np.zeros((len(genomes), 10, genomes[0].shape[1]))
+        for i, dna in enumerate(genomes):
+            batch[i, :len(dna)] = dna
+        counts = genome.Genome.count_expanded_links(batch, lengths)
+        self.assertEqual(counts.tolist(), [genome.Genome.count_expanded_links(dna) for dna in genomes])
@@ -0,0 +1,78 @@
+import os
+import shutil
+import unittest
+import threading
+import numpy as np
+from app import history
+from creatures import population
+
+class RunHistoryTest(unittest.TestCase):
+    def testAppendAndRead(self):
+        self.assertIsNotNone(history.RunHistory)
+        base_dir = ".tmp/test_history"
+        if os.path.exists(base_dir): shutil.rmtree(base_dir)
+
+        with history.RunHistory(f"{base_dir}/history.db", buffer_size = 8) as run_history:
+            for generation in range(4):
+                run_history.append(generation,
+                                   n_exp_links = np.arange(3) + generation,
+                                   n_flat_links = np.arange(3),
+                                   distances = np.linspace(0, 1, 3) * generation,
+                                   fitness = np.ones(3),
+                                   parents = np.array([(0, 1), (1, -1), (-1, -1)]))
+            # rows stay buffered until the buffer fills up or is read
+            self.assertGreater(len(run_history.buffer), 0)
+            self.assertEqual(len(run_history), 12)
+            self.assertEqual(run_history.get_generations().tolist(), [0, 1, 2, 3])
+
+            rows = run_history.read(1, 3)
+            self.assertEqual(rows.dtype, history.RunHistory.get_dtype())
+            self.assertEqual(rows["generation"].tolist(), [1, 1, 1, 2, 2, 2])
+            self.assertEqual(rows["creature"].tolist(), [0, 1, 2, 0, 1, 2])
+            self.assertEqual(rows["n_exp_links"].tolist(), [1, 2, 3, 2, 3, 4])
+            self.assertEqual(rows["parent1"].tolist(), [0, 1, -1] * 2)
+
+            # reporting a generation again replaces its rows
+            run_history.append(3, [9] * 3, [1] * 3, [0.5] * 3, [2] * 3)
+            self.assertEqual(len(run_history), 12)
+            self.assertEqual(run_history.read(3)["n_exp_links"].tolist(), [9, 9, 9])
+
+        # the store survives reopening
+        with history.RunHistory(f"{base_dir}/history.db") as run_history:
+            self.assertEqual(len(run_history.read()), 12)
+        shutil.rmtree(base_dir)
+
+    def testPopulationReport(self):
+        pop = population.Population(6, 3)
+        for i, cr in enumerate(pop.creatures):
+            cr.update_position((i + 1, 0, 1))
+        report = pop.get_report()
+        self.assertTrue((report["parents"] == -1).all())
+
+        pop.new_generation(num_of_elites = 2, num_of_random = 1)
+        report = pop.get_report()
+        self.assertEqual(report["parents"].shape, (6, 2))
+        # children have two parents, elites and random copies only one
+        self.assertTrue((report["parents"][:3] >= 0).all())
+        self.assertTrue((report["parents"][3:, 1] == -1).all())
+        for key in ("n_exp_links", "n_flat_links", "distances", "fitness"):
+            self.assertEqual(len(report[key]), 6)
+
+    def testConcurrentAppendAndRead(self):
+        base_dir = ".tmp/test_history_threads"
+        if os.path.exists(base_dir): shutil.rmtree(base_dir)
+        num_of_generations, pop_size = 200, 7
+
+        with history.RunHistory(os.path.join(base_dir, "history.db"), buffer_size = 10) as run_history:
+            def append():
+                for generation in range(num_of_generations):
+                    run_history.append(generation, np.ones(pop_size), np.ones(pop_size), np.ones(pop_size), np.ones(pop_size))
+            writer = threading.Thread(target = append)
+            writer.start()
+            # reads flush the buffer while the writer thread keeps appending
+            while writer.is_alive():
+                run_history.read()
+                len(run_history)
+            writer.join()
+            self.assertEqual(len(run_history), num_of_generations * pop_size)
+            self.assertEqual(run_history.get_generations().tolist(), list(range(num_of_generations)))
@@ -0,0 +1,75 @@
+import os
+import shutil
+import unittest
+import numpy as np
+from app.islands import IslandModel
+
+
+class IslandTest(unittest.TestCase):
+    def testIslandSettings(self):
+        self.assertEqual(IslandModel.get_topologies(), ("ring", "random"))
+        with self.assertRaises(Exception):
+            IslandModel(".tmp/islands", topology = "star")
+        with self.assertRaises(Exception):
+            IslandModel(".tmp/islands", island = 1)
+        with self.assertRaises(AssertionError):
+            IslandModel(".tmp/islands", num_of_islands = 0)
+
+    def testIslandTargets(self):
+        self.assertEqual(IslandModel.get_targets("ring", 4).tolist(), [1, 2, 3, 0])
+        for n in (2, 3, 7):
+            targets = IslandModel.get_targets("random", n, np.random.default_rng(n))
+            # every island sends to another one and receives from exactly one
+            self.assertEqual(sorted(targets.tolist()), list(range(n)))
+            self.assertFalse((targets == np.arange(n)).any())
+            # following the targets visits every island
+            island, visited = 0, set()
+            for _ in range(n):
+                visited.add(island)
+                island = targets[island]
+            self.assertEqual(len(visited), n)
+        self.assertEqual(IslandModel.get_targets("random", 5, np.random.default_rng(1)).tolist(),
+                         IslandModel.get_targets("random", 5, np.random.default_rng(1)).tolist())
+
+    def testIslandRun(self):
+        base_dir = ".tmp/simulation-test-islands"
+        if os.path.exists(base_dir): shutil.rmtree(base_dir)
+        model = IslandModel(base_dir, num_of_islands = 2, migrate_each = 2, num_of_migrants = 1, topology = "random",
+                            seed = 5, population_size = 5, num_of_generation = 4, multiprocess = False, pool_size = 1)
+        stats = model.run(log_each = 1)
+
+        self.assertEqual([island_stats["island"] for island_stats in stats], [0, 1])
+        for island_stats in stats:
+            self.assertEqual(island_stats["generations"], 4)
+            self.assertEqual(island_stats["migrations"], 1)
+            self.assertGreater(island_stats["creatures_per_sec"], 0)
+            self.assertTrue(os.path.exists(f"{base_dir}/island_{island_stats['island']}/log.txt"))
+        with open(os.path.join(base_dir, "islands.txt")) as f:
+            self.assertEqual(len(f.read().splitlines()), 3)
+
+    def testIslandResume(self):
+        base_dir = ".tmp/simulation-test-islands-resume"
+        if os.path.exists(base_dir): shutil.rmtree(base_dir)
+        settings = {"num_of_islands": 2, "migrate_each": 2, "num_of_migrants": 1, "seed": 5, "population_size": 5,
+                    "multiprocess": False, "pool_size": 1}
+        IslandModel(base_dir, num_of_generation = 4, **settings).run(save_each = 1)
+        # island 1 resumes behind island 0, so it must skip the round at 2
+        for generation in (2, 3):
+            os.remove(f"{base_dir}/island_1/pop/{generation}.npz")
+        stats = IslandModel(base_dir, num_of_generation = 6, load_progress = True, **settings).run()
+        self.assertEqual([island_stats["migrations"] for island_stats in stats], [1, 1])
+        self.assertEqual([island_stats["generations"] for island_stats in stats], [6, 6])
+
+    def testIslandFailure(self):
+        base_dir = ".tmp/simulation-test-islands-failure"
+        if os.path.exists(base_dir): shutil.rmtree(base_dir)
+        os.makedirs(f"{base_dir}/island_1/pop")
+        with open(f"{base_dir}/island_1/pop/9.npz", "w") as f:
+            f.write("not a checkpoint")
+        model = IslandModel(base_dir, num_of_islands = 2, migrate_each = 1, seed = 5, population_size = 5,
+                            num_of_generation = 4, multiprocess = False, pool_size = 1, load_progress = True,
+                            migration_timeout = None)
+        # island 0 stops waiting for island 1 instead of hanging
+        with self.assertRaises(Exception) as context:
+            model.run()
+        self.assertNotIn("stopped", str(context.exception))
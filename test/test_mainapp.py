@@ -4,6 +4,7 @@ import shutil
 import unittest
 import numpy as np
 from app import app, simulator
+from app.surrogate import SurrogateModel
 from creatures import population
 
 class AppTest(unittest.TestCase):
@@ -22,7 +23,7 @@ class AppTest(unittest.TestCase):
         self.assertIsNotNone(main.pop)
         self.assertEqual(type(main.sim), simulator.MultiSimulator)
         self.assertEqual(type(main.pop), population.Population)
-        self.assertEqual(len(main.sim.sims), 5)
+        self.assertEqual(len(main.sim.workers), 5)
         self.assertEqual(len(main.pop.creatures), 5)
         
         sim_type_1 = type(main.sim)
@@ -63,16 +64,59 @@ class AppTest(unittest.TestCase):
         
         main = app.MainApp(base_dir = base_dir, population_size = pop_size, num_of_generation = num_gens)
         self.assertTrue(os.path.exists(base_dir))
-        self.assertEqual(len(os.listdir(base_dir + "/pop/0")), pop_size)
+        self.assertTrue(os.path.exists(base_dir + "/pop/0.npz"))
         
         main.run(save_after = True,
                  save_each = save_each)
         self.assertEqual(len(os.listdir(base_dir + "/pop")), num_gens + 1) # +1 for initialization and after simulation
         
         for i in range(num_gens + 1): # +1 for initialization and after simulation
-            self.assertEqual(len(os.listdir(f"{base_dir}/pop/{i}")), pop_size)
+            pop = population.Population(1)
+            generation, state = pop.from_checkpoint(f"{base_dir}/pop/{i}.npz")
+            self.assertEqual(len(pop.creatures), pop_size)
+            self.assertEqual(generation, i)
+            self.assertEqual(state["seed"], main.seed)
         
         
+    def testAppLoadLegacyPopulation(self):
+        base_dir = ".tmp/simulation-test-legacy"
+        pop_size = 5
+        
+        if os.path.exists(base_dir): shutil.rmtree(base_dir)
+        
+        # a run saved with one CSV per creature
+        old_pop = population.Population(pop_size, 3)
+        old_pop.to_csvs(f"{base_dir}/pop/7", "cr")
+        
+        main = app.MainApp(base_dir = base_dir, population_size = pop_size, load_progress = True,
+                           multiprocess = False, pool_size = 1)
+        self.assertEqual(main.current_generation, 7)
+        for cr1, cr2 in zip(main.pop.creatures, old_pop.creatures):
+            self.assertTrue((cr1.dna == cr2.dna).all())
+        
+        main.convert_population()
+        self.assertTrue(os.path.exists(f"{base_dir}/pop/7.npz"))
+        main.load_population(7)
+        for cr1, cr2 in zip(main.pop.creatures, old_pop.creatures):
+            self.assertTrue((cr1.dna == cr2.dna).all())
+        main.close()
+        
+            
+    def testAppCloseAfterFailedWrite(self):
+        base_dir = ".tmp/simulation-test-close"
+        if os.path.exists(base_dir): shutil.rmtree(base_dir)
+        main = app.MainApp(base_dir = base_dir, population_size = 3, multiprocess = False, pool_size = 1)
+        sim, history = main.sim, main.history
+        main.writer.submit(int, "not a number")
+        # the failed write is raised once the simulator and history are closed
+        with self.assertRaises(ValueError):
+            main.close()
+        self.assertIsNone(main.sim)
+        self.assertIsNone(main.history)
+        self.assertIsNone(sim.client_id)
+        self.assertIsNone(history.connection)
+        main.close()
+
     def testAppLoadPopulation(self):
         self.assertIsNotNone(app.MainApp.load_population)
         
@@ -114,10 +158,60 @@ class AppTest(unittest.TestCase):
         main = app.MainApp(base_dir = base_dir, num_of_generation=num_gens, population_size = pop_size)
         main.run(save_after = True, report_after = True, save_each = 1, report_each = 1, log_each = 1)
     
-        self.assertTrue(os.path.exists(os.path.join(base_dir, "report")))
-        self.assertEqual(len(os.listdir(os.path.join(base_dir, "report"))), num_gens + 1) # +1 for initialization and after simulation
+        self.assertTrue(os.path.exists(os.path.join(base_dir, "history.db")))
+        with open(os.path.join(base_dir, "log.txt")) as f:
+            self.assertEqual(len(f.readlines()), num_gens)
+        self.assertEqual(len(main.history.get_generations()), num_gens + 1) # +1 for initialization and after simulation
+        self.assertEqual(len(main.history), (num_gens + 1) * pop_size)
+        last = main.history.read(num_gens)
+        self.assertTrue((last["distance"] == [cr.get_distance() for cr in main.pop.creatures]).all())
     
     
+    def testSeededRun(self):
+        base_dir = ".tmp/simulation-test-seed"
+        if os.path.exists(base_dir): shutil.rmtree(base_dir)
+        settings = dict(population_size = 5, multiprocess = False, pool_size = 1, seed = 7)
+
+        main1 = app.MainApp(base_dir = base_dir + "/1", num_of_generation = 3, **settings)
+        main1.run(save_after = True, save_each = 1)
+        main2 = app.MainApp(base_dir = base_dir + "/2", num_of_generation = 3, **settings)
+        main2.run()
+        for cr1, cr2 in zip(main1.pop.creatures, main2.pop.creatures):
+            self.assertTrue((cr1.dna == cr2.dna).all())
+            self.assertEqual(cr1.get_distance(), cr2.get_distance())
+        self.assertTrue(os.path.exists(f"{base_dir}/1/pop/3.npz"))
+
+        # a run resumed from its checkpoint replays the uninterrupted one
+        main3 = app.MainApp(base_dir = base_dir + "/1", num_of_generation = 5, load_progress = True,
+                            **dict(settings, seed = None))
+        self.assertEqual(main3.seed, 7)
+        main3.run()
+        main4 = app.MainApp(base_dir = base_dir + "/3", num_of_generation = 5, **settings)
+        main4.run()
+        for cr3, cr4 in zip(main3.pop.creatures, main4.pop.creatures):
+            self.assertTrue((cr3.dna == cr4.dna).all())
+        for main in (main1, main2, main3, main4):
+            main.close()
+
+    def testSurrogateRun(self):
+        base_dir = ".tmp/simulation-test-surrogate"
+        if os.path.exists(base_dir): shutil.rmtree(base_dir)
+        surrogate = SurrogateModel(oversample = 2, min_samples = 10)
+        with app.MainApp(base_dir = base_dir, population_size = 10, num_of_generation = 3, multiprocess = False,
+                         pool_size = 1, num_of_elites = 2, num_of_random = 0, seed = 3, surrogate = surrogate) as main:
+            main.run(log_each = 1)
+            self.assertEqual(len(main.pop.creatures), 10)
+            self.assertTrue(surrogate.is_ready())
+            # 8 children a generation are picked from 16 candidates
+            self.assertEqual(surrogate.n_screened_out, 8)
+            # the first generation once, then only the children of the three
+            # generations bred after it
+            self.assertEqual(len(surrogate.targets), 10 + 3 * 8)
+        with open(os.path.join(base_dir, "log.txt")) as f:
+            rows = [line.split(",") for line in f.read().splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual([int(row[-2]) for row in rows[1:]], [8, 8])
+
     def testContinousRun(self):
         base_dir  = ".tmp/simulation-test-run"
         pop_size  = 5
@@ -144,10 +238,11 @@ class AppTest(unittest.TestCase):
                 self.assertEqual(main2.pop.creatures[i].dna.shape, main3.pop.creatures[i].dna.shape)
                 self.assertTrue((main2.pop.creatures[i].dna == main3.pop.creatures[i].dna).all())
         
-            pop_dir = os.path.join(base_dir, "pop", str(num_gens))
-            self.assertTrue(os.path.exists(pop_dir))
-            self.assertEqual(len(os.listdir(pop_dir)), pop_size)
+            pop_path = os.path.join(base_dir, "pop", f"{num_gens}.npz")
+            self.assertTrue(os.path.exists(pop_path))
+            pop = population.Population(1)
+            pop.from_checkpoint(pop_path)
+            self.assertEqual(len(pop.creatures), pop_size)
             
-            report_dir = os.path.join(base_dir, "report")
-            self.assertTrue(os.path.exists(report_dir))
-            self.assertEqual(len(os.listdir(report_dir)), (num_gens) + 1)
\ No newline at end of file
+            self.assertTrue(os.path.exists(os.path.join(base_dir, "history.db")))
+            self.assertEqual(len(main3.history.get_generations()), (num_gens) + 1)
\ No newline at end of file
@@ -25,6 +25,22 @@ class BodyPartTest(unittest.TestCase):
         self.assertIsNotNone(link_tag)
         self.assertIsInstance(joint_tag, Element)
         self.assertIsInstance(link_tag, Element)
+
+    def testBodyPartURDF(self):
+        self.assertIsNotNone(phenotype.BodyPart.body_part_urdf)
+
+        adom = getDOMImplementation().createDocument(None, "start", None)
+        indent = lambda tag: "".join("\t" + line + "\n" for line in tag.toprettyxml().splitlines())
+        for _ in range(10):
+            g_dict = genome.Genome.to_dict(genome.Genome.init_genome(1))[0]
+            link_tag, joint_tag = phenotype.BodyPart.body_part_xml("Link_1_2", "Link_0", g_dict, adom)
+            link_str, joint_str = phenotype.BodyPart.body_part_urdf("Link_1_2", "Link_0", g_dict)
+            self.assertEqual(link_str, indent(link_tag))
+            self.assertEqual(joint_str, indent(joint_tag))
+
+            link_str, joint_str = phenotype.BodyPart.body_part_urdf("Link_1_2", "Link_0", g_dict, pretty = False)
+            self.assertEqual(link_str, link_tag.toxml())
+            self.assertEqual(joint_str, joint_tag.toxml())
         
 class MotorTest(unittest.TestCase):
     def testMotorOutput(self):
@@ -51,4 +67,26 @@ class MotorTest(unittest.TestCase):
         self.assertGreaterEqual(m(), 0)
         self.assertGreaterEqual(m(), 0)
         self.assertLessEqual(m(), 0)
-        self.assertLessEqual(m(), 0)
\ No newline at end of file
+        self.assertLessEqual(m(), 0)
+
+class MotorBankTest(unittest.TestCase):
+    def testMotorBankOutput(self):
+        self.assertIsNotNone(phenotype.MotorBank)
+        self.assertIsNotNone(phenotype.MotorBank.from_motors)
+
+        motors = [phenotype.Motor(motor_type, *np.random.random(3)) for motor_type in (0, 1, 2, 2, 1, 0)]
+        bank = phenotype.MotorBank.from_motors(motors)
+        self.assertEqual(len(bank), len(motors))
+
+        for _ in range(50):
+            velocities = bank()
+            self.assertEqual(velocities.shape, (len(motors),))
+            self.assertTrue((velocities == np.array([m() for m in motors])).all())
+
+    def testMotorBankEdgeCases(self):
+        bank = phenotype.MotorBank([], [], [], [])
+        self.assertEqual(len(bank), 0)
+        self.assertEqual(len(bank()), 0)
+
+        with self.assertRaises(Exception):
+            phenotype.MotorBank([3], [1.57], [0.25], [0.4])
@@ -75,6 +75,38 @@ class PopulationTest(unittest.TestCase):
         
         shutil.rmtree(base_dir)
 
+    def testCheckpointPopulation(self):
+        num_cr = 10
+        base_dir = ".tmp/test_checkpoint"
+        
+        pop1 = population.Population(num_cr, 5)
+        pop1.reset_population([creature.Creature(i % 4 + 2) for i in range(num_cr)])
+        for i, cr in enumerate(pop1.creatures):
+            cr.update_position((i, i / 3, 1.0))
+        pop1.to_checkpoint(f"{base_dir}/pop.npz", 12, {"seed": 3})
+        
+        pop2 = population.Population(1)
+        generation, state = pop2.from_checkpoint(f"{base_dir}/pop.npz")
+        self.assertEqual(generation, 12)
+        self.assertEqual(state, {"seed": 3})
+        self.assertEqual(len(pop1.creatures), len(pop2.creatures))
+        for cr1, cr2 in zip(pop1.creatures, pop2.creatures):
+            # binary checkpoints keep the exact DNA and the positions
+            self.assertEqual(cr1.dna.shape, cr2.dna.shape)
+            self.assertTrue((cr1.dna == cr2.dna).all())
+            self.assertEqual(cr1.last_position, cr2.last_position)
+            self.assertEqual(cr1.get_distance(), cr2.get_distance())
+        
+        # CSV folders convert into the same DNA
+        pop1.to_csvs(f"{base_dir}/data", "dna")
+        population.Population.csvs_to_checkpoint(f"{base_dir}/data", f"{base_dir}/converted.npz", "dna")
+        generation, state = pop2.from_checkpoint(f"{base_dir}/converted.npz")
+        self.assertEqual((generation, state), (0, {}))
+        for cr1, cr2 in zip(pop1.creatures, pop2.creatures):
+            self.assertTrue((cr1.dna == cr2.dna).all())
+        
+        shutil.rmtree(base_dir)
+
     def testNewGeneration(self):
         self.assertIsNotNone(population.Population.new_generation)
 
@@ -92,7 +124,9 @@ class PopulationTest(unittest.TestCase):
         for cr in pop.creatures:
             cr.last_position = (rand(), rand(), rand())
             
+        num_of_children = pop_size - num_of_elites - num_of_random
         for _ in range(15):
+            max_expanded_length = np.max([len(cr.get_expanded_links()) for cr in pop.creatures]) * max_growth_rt
             pop.new_generation(
                 num_of_elites = num_of_elites,
                 num_of_random = num_of_random,
@@ -105,6 +139,11 @@ class PopulationTest(unittest.TestCase):
             self.assertEqual(len(pop.creatures), pop_size)
             for cr in pop.creatures:
                 self.assertEqual(cr.dna.shape[1], len(genome.Genome.get_spec()))
+            # oversized children are trimmed under the cap instead of mated again
+            for cr in pop.creatures[:num_of_children]:
+                self.assertLessEqual(len(cr.get_expanded_links()), max_expanded_length)
+                self.assertGreaterEqual(len(cr.dna), min_length)
+            self.assertLessEqual(pop.n_repaired, num_of_children)
             
         with self.assertRaises(AssertionError):
             pop.new_generation(
@@ -148,4 +187,24 @@ class PopulationTest(unittest.TestCase):
                 max_growth_rt = max_growth_rt,
                 mutation_freq = mutation_freq,
                 mutation_amnt = mutation_amnt,
-            )
\ No newline at end of file
+            )
+    def testPopulationMigrants(self):
+        pop1 = population.Population(6, 3)
+        pop2 = population.Population(6, 4)
+        for i, cr in enumerate(pop1.creatures):
+            cr.update_position((i + 1, 0, 0))
+        for i, cr in enumerate(pop2.creatures):
+            cr.update_position((0, i + 1, 0))
+
+        migrants = pop1.get_migrants(2)
+        self.assertEqual(migrants["dna"].shape[0], 2)
+        self.assertTrue((migrants["last_positions"][:, 0] >= 5).all())
+
+        pop2.add_migrants(migrants)
+        self.assertEqual(len(pop2.creatures), 6)
+        # the two least fit creatures were replaced and keep their positions
+        moved = [cr for cr in pop2.creatures if cr.last_position[0] > 0]
+        self.assertEqual(len(moved), 2)
+        self.assertEqual(sorted(cr.last_position[1] for cr in pop2.creatures if cr not in moved), [3, 4, 5, 6])
+        for cr in moved:
+            self.assertTrue(any(cr.dna.shape == other.dna.shape and (cr.dna == other.dna).all() for other in pop1.creatures))
@@ -1,5 +1,8 @@
+import os
+import sys
 import unittest
 import numpy as np
+import pybullet as p
 from app import simulator
 from creatures import creature, population
 
@@ -24,6 +27,23 @@ class SimulatorTest(unittest.TestCase):
             self.assertNotEqual(dis1, dis2)
             self.assertLessEqual(dis1, dis2)
 
+    def testSimulatorRunResult(self):
+        self.assertIsNotNone(simulator.RunResult)
+        sim = simulator.Simulator()
+
+        for _ in range(5):
+            cr = creature.Creature(5)
+            result = sim.run_creature(cr, max_frame = 480)
+            self.assertIsInstance(result, simulator.RunResult)
+            self.assertEqual(result.last_position, cr.last_position)
+            self.assertIn(result.reason, ("complete", "error", "jump", "fall"))
+            if result.reason == "complete":
+                self.assertEqual(result.frames, 480)
+            else:
+                self.assertLess(result.frames, 480)
+                self.assertEqual(result.last_position, (0, 0, 0))
+        sim.close()
+
     def testSimulatorForPopulation(self):
         pop = population.Population(5)
         sim = simulator.Simulator()
@@ -38,6 +58,137 @@ class SimulatorTest(unittest.TestCase):
         self.assertEqual(np.mean(0 <= dists1), 1)
         self.assertEqual(np.mean(0 <= dists2), 1)
 
+    def testSimulatorMemoryURDF(self):
+        self.assertIn("file", simulator.Simulator.get_urdf_modes())
+        self.assertIn("memory", simulator.Simulator.get_urdf_modes())
+        with self.assertRaises(Exception):
+            simulator.Simulator(urdf_mode = "invalid")
+        # memory mode is refused up front where the platform cannot provide it
+        self.assertEqual(simulator.Simulator.supports_memory_urdf(), sys.platform.startswith("linux"))
+        if not simulator.Simulator.supports_memory_urdf():
+            with self.assertRaises(Exception):
+                simulator.Simulator(urdf_mode = "memory")
+            return
+
+        file_sim = simulator.Simulator(urdf_mode = "file")
+        memory_sim = simulator.Simulator(urdf_mode = "memory")
+        dirname = ".tmp/test_memory_urdf"
+
+        for _ in range(5):
+            cr = creature.Creature(5)
+            file_sim.run_creature(cr, max_frame = 480)
+            pos1 = cr.last_position
+            cr.reset_motors()
+            memory_sim.run_creature(cr, max_frame = 480, dirname = dirname)
+            pos2 = cr.last_position
+            self.assertEqual(pos1, pos2)
+
+        # no URDF file touches the disk in memory mode
+        self.assertFalse(os.path.exists(dirname))
+        memory_sim.close()
+        file_sim.close()
+
+    def testSimulatorPersistentWorld(self):
+        self.assertIn("reset", simulator.Simulator.get_world_modes())
+        self.assertIn("persistent", simulator.Simulator.get_world_modes())
+        with self.assertRaises(Exception):
+            simulator.Simulator(world_mode = "invalid")
+
+        reset_sim = simulator.Simulator(world_mode = "reset")
+        persistent_sim = simulator.Simulator(world_mode = "persistent")
+
+        for _ in range(5):
+            cr = creature.Creature(5)
+            result1 = reset_sim.run_creature(cr, max_frame = 480)
+            cr.reset_motors()
+            result2 = persistent_sim.run_creature(cr, max_frame = 480)
+            self.assertEqual(result1.last_position, result2.last_position)
+            self.assertEqual(result1.frames, result2.frames)
+            self.assertEqual(result1.reason, result2.reason)
+
+        # only the plane and the last robot are kept in the world
+        self.assertEqual(p.getNumBodies(physicsClientId = persistent_sim.client_id), 2)
+        persistent_sim.close()
+        reset_sim.close()
+
+    def testSimulatorBatchedWorld(self):
+        with self.assertRaises(Exception):
+            simulator.Simulator(batch_size = 0)
+        with self.assertRaises(Exception):
+            simulator.Simulator(batch_size = simulator.Simulator.get_max_batch_size() + 1)
+
+        creatures = [creature.Creature(i % 3 + 2) for i in range(5)]
+        for world_mode in simulator.Simulator.get_world_modes():
+            with simulator.Simulator(world_mode = world_mode) as sim:
+                # a batch of one is the same as a single run
+                creatures[0].reset_motors()
+                result1 = sim.run_creature(creatures[0], max_frame = 480)
+                creatures[0].reset_motors()
+                result2 = sim.run_creatures(creatures[:1], max_frame = 480)[0]
+                self.assertEqual(result1.last_position, result2.last_position)
+
+                for cr in creatures:
+                    cr.reset_motors()
+                results = sim.run_creatures(creatures, max_frame = 480)
+                self.assertEqual(len(results), len(creatures))
+                self.assertLessEqual(len(sim.robots), len(creatures))
+                for cr, result in zip(creatures, results):
+                    self.assertEqual(cr.last_position, result.last_position)
+                    self.assertIn(result.reason, ("complete", "error", "jump", "fall"))
+                    if result.reason != "complete":
+                        self.assertEqual(result.last_position, (0, 0, 0))
+
+        # batched results depend on the batch mates, so they are never cached
+        with self.assertRaises(Exception):
+            simulator.Simulator(cache_size = 16, batch_size = 3)
+        with self.assertRaises(Exception):
+            simulator.MultiSimulator(2, cache_size = 16, batch_size = 3)
+
+        pop = population.Population(7, 3)
+        with simulator.MultiSimulator(2, batch_size = 3) as sim:
+            sim.eval_population(pop, 240)
+            self.assertEqual(len(sim.results), 7)
+            self.assertNotIn(None, sim.results)
+            self.assertEqual(sim.get_params(), (1, 3))
+        for cr, result in zip(pop.creatures, sim.results):
+            self.assertEqual(cr.last_position, result.last_position)
+
+    def testSimulatorSampling(self):
+        with self.assertRaises(Exception):
+            simulator.Simulator(sample_every = 0)
+
+        dense_sim = simulator.Simulator()
+        sparse_sim = simulator.Simulator(sample_every = 60)
+        self.assertNotEqual(dense_sim.get_params(), sparse_sim.get_params())
+
+        for _ in range(5):
+            cr = creature.Creature(5)
+            dense = dense_sim.run_creature(cr, max_frame = 500)
+            cr.reset_motors()
+            sparse = sparse_sim.run_creature(cr, max_frame = 500)
+            # the final position is read exactly, invalid runs end at a sampled frame
+            if sparse.reason == "complete":
+                self.assertEqual(sparse.frames, 500)
+                if dense.reason == "complete":
+                    self.assertEqual(sparse.last_position, dense.last_position)
+            else:
+                self.assertEqual(sparse.last_position, (0, 0, 0))
+                self.assertTrue(sparse.frames % 60 == 0 or sparse.frames == 500)
+                if dense.reason != "complete":
+                    self.assertLessEqual(dense.frames, sparse.frames)
+        sparse_sim.close()
+        dense_sim.close()
+
+        pop = population.Population(4)
+        with simulator.MultiSimulator(2, sample_every = 60) as sim:
+            sim.eval_population(pop, 500)
+            results = sim.results
+        single_sim = simulator.Simulator(sample_every = 60)
+        for cr, result in zip(pop.creatures, results):
+            cr.reset_motors()
+            self.assertEqual(single_sim.run_creature(cr, max_frame = 500).last_position, result.last_position)
+        single_sim.close()
+
     def testMultiSimulator(self):
         self.assertIsNotNone(simulator.MultiSimulator)
         
@@ -49,6 +200,59 @@ class SimulatorTest(unittest.TestCase):
         dists2 = np.array([cr.get_distance() for cr in pop.creatures])
         self.assertEqual(np.mean(0 <= dists2), 1)        
 
+        with simulator.MultiSimulator(2, urdf_mode = "memory") as memory_sim:
+            memory_sim.eval_population(pop)
+        dists3 = np.array([cr.get_distance() for cr in pop.creatures])
+        self.assertTrue((dists2 == dists3).all())
+
+    def testMultiSimulatorLifecycle(self):
+        pop = population.Population(10)
+
+        with simulator.MultiSimulator(3) as sim:
+            self.assertEqual(len(sim.workers), 3)
+            pids = [worker.pid for worker in sim.workers]
+            for _ in range(2):
+                sim.eval_population(pop)
+                self.assertEqual(len(pop.creatures), 10)
+                self.assertEqual([worker.pid for worker in sim.workers], pids)
+            workers = sim.workers
+
+        self.assertEqual(len(sim.workers), 0)
+        for worker in workers:
+            self.assertFalse(worker.is_alive())
+        with self.assertRaises(Exception):
+            sim.eval_population(pop)
+
+    def testMultiSimulatorScheduling(self):
+        self.assertIsNotNone(simulator.MultiSimulator.estimate_cost)
+        self.assertIsNotNone(simulator.MultiSimulator.get_utilisation)
+
+        small = creature.Creature(2)
+        large = creature.Creature(8)
+        self.assertEqual(simulator.MultiSimulator.estimate_cost(small, 100), len(small.get_expanded_links()) * 100)
+        self.assertLessEqual(simulator.MultiSimulator.estimate_cost(small, 100),
+                             simulator.MultiSimulator.estimate_cost(large, 100))
+
+        pop = population.Population(8)
+        pop.reset_population([creature.Creature(i % 4 + 2) for i in range(8)])
+        creatures = list(pop.creatures)
+        with simulator.MultiSimulator(3) as sim:
+            sim.eval_population(pop, 240)
+            utilisation = sim.get_utilisation()
+            results = sim.results
+
+        # results are applied in place and in the original order regardless of dispatch order
+        single_sim = simulator.Simulator()
+        for i, cr in enumerate(pop.creatures):
+            self.assertIs(cr, creatures[i])
+            self.assertEqual(cr.last_position, results[i].last_position)
+            cr.reset_motors()
+            self.assertEqual(single_sim.run_creature(cr, max_frame = 240).last_position, results[i].last_position)
+        single_sim.close()
+        self.assertEqual(len(utilisation), 3)
+        self.assertEqual(np.mean(utilisation >= 0), 1)
+        self.assertGreater(np.sum(utilisation), 0)
+
     def testExtremeLengthPopulation(self):
         pop_size = 15
     
@@ -0,0 +1,66 @@
+import unittest
+from app import simulator, stopping
+from creatures import population
+
+class StoppingPolicyTest(unittest.TestCase):
+    def testPolicyCheck(self):
+        self.assertIsNotNone(stopping.StoppingPolicy)
+
+        policy = stopping.StoppingPolicy(check_every = 10, min_frame = 20, still_speed = 0.1, still_checks = 3)
+        self.assertIsNone(policy.check(10, 100, (0, 0, 1), (0, 0, 0)))
+        self.assertIsNone(policy.check(20, 100, (0, 0, 1), (0, 0, 0.05)))
+        self.assertEqual(policy.check(30, 100, (0, 0, 1), (0, 0, 0)), "still")
+        # movement resets the count
+        self.assertIsNone(policy.check(40, 100, (0, 0, 1), (1, 0, 0)))
+        policy.reset()
+        self.assertEqual(policy.still_count, 0)
+
+        policy = stopping.StoppingPolicy(check_every = 10, min_frame = 0, settle_distance = 0.1, settle_frames = 20)
+        self.assertIsNone(policy.check(10, 100, (0, 0, 1)))
+        self.assertIsNone(policy.check(20, 100, (1, 0, 1)))
+        self.assertIsNone(policy.check(30, 100, (1, 0, 1)))
+        self.assertEqual(policy.check(40, 100, (1.05, 0, 1)), "settled")
+
+        # at 1 unit per second, 240 frames are left to cover the remaining unit
+        policy = stopping.StoppingPolicy(check_every = 10, min_frame = 0, max_speed = 1, elite_distance = 2)
+        self.assertIsNone(policy.check(240, 480, (0, 0, 1)))
+        self.assertEqual(policy.check(250, 480, (0, 0, 1)), "hopeless")
+        self.assertNotIn(policy.elite_distance, policy.get_params())
+
+    def testPolicySummary(self):
+        results = [simulator.RunResult((0, 0, 1), 480, "complete"),
+                   simulator.RunResult((0, 0, 1), 120, "still"),
+                   simulator.RunResult((0, 0, 1), 360, "hopeless"),
+                   simulator.RunResult((0, 0, 0), 10, "fall")]
+        reasons, saved_frames = stopping.StoppingPolicy.summarise(results, 480)
+        self.assertEqual(reasons, {"complete": 1, "still": 1, "hopeless": 1, "fall": 1})
+        self.assertEqual(saved_frames, 360 + 120)
+
+    def testSimulatorStopping(self):
+        pop = population.Population(6, 3)
+        with simulator.Simulator() as sim:
+            sim.eval_population(pop, 960)
+            full_results = sim.results
+
+        policy = stopping.StoppingPolicy(still_speed = 0.05)
+        with simulator.Simulator(policy = policy) as sim:
+            sim.eval_population(pop, 960)
+            for full, result in zip(full_results, sim.results):
+                self.assertIn(result.reason, ("complete", "error", "jump", "fall") + policy.get_reasons())
+                self.assertLessEqual(result.frames, full.frames)
+                if result.reason in policy.get_reasons():
+                    self.assertEqual(result.frames % policy.check_every, 0)
+                    self.assertNotEqual(result.last_position, (0, 0, 0))
+
+        # no creature gets 100 units away, so every valid run is stopped at `min_frame`
+        policy = stopping.StoppingPolicy(max_speed = 1, elite_distance = 100)
+        with simulator.Simulator(cache_size = 10, policy = policy) as sim:
+            sim.eval_population(pop, 960)
+            for result in sim.results:
+                if result.reason == "hopeless":
+                    self.assertEqual(result.frames, policy.min_frame)
+            self.assertEqual(len(sim.cache), sum(result.reason != "hopeless" for result in sim.results))
+
+        with simulator.MultiSimulator(2, policy = policy) as sim:
+            sim.eval_population(pop, 960)
+            self.assertIn("hopeless", [result.reason for result in sim.results])
@@ -0,0 +1,83 @@
+import unittest
+import numpy as np
+from app.surrogate import SurrogateModel
+from creatures import genome
+
+
+def random_batch(n:int, rng:np.random.Generator, max_length:int = 8):
+    lengths = rng.integers(2, max_length + 1, n)
+    dna = np.zeros((n, max_length, len(genome.Genome.get_spec())))
+    for i, length in enumerate(lengths):
+        dna[i, :length] = genome.Genome.init_genome(length, rng)
+    return dna, lengths
+
+
+class SurrogateTest(unittest.TestCase):
+    def testSurrogateSettings(self):
+        self.assertEqual(SurrogateModel.get_models(), ("ridge", "knn"))
+        with self.assertRaises(Exception):
+            SurrogateModel(model = "forest")
+        with self.assertRaises(AssertionError):
+            SurrogateModel(oversample = 0.5)
+        with self.assertRaises(AssertionError):
+            SurrogateModel(min_samples = 10, window = 5)
+
+    def testSurrogatePrediction(self):
+        rng = np.random.default_rng(0)
+        for model in SurrogateModel.get_models():
+            surrogate = SurrogateModel(model = model, min_samples = 100)
+            self.assertFalse(surrogate.is_ready())
+            # the distance grows with the number of genes
+            dna, lengths = random_batch(400, rng)
+            surrogate.update(dna, lengths, lengths * 2.0)
+            self.assertTrue(surrogate.is_ready())
+
+            dna, lengths = random_batch(100, rng)
+            predictions = surrogate.predict(dna, lengths)
+            self.assertEqual(predictions.shape, (100,))
+            self.assertGreater(np.corrcoef(predictions, lengths)[0, 1], 0.9)
+
+    def testSurrogateWindow(self):
+        rng = np.random.default_rng(1)
+        surrogate = SurrogateModel(window = 50, min_samples = 10)
+        for _ in range(3):
+            dna, lengths = random_batch(30, rng)
+            surrogate.update(dna, lengths, lengths)
+        self.assertEqual(len(surrogate.targets), 50)
+        self.assertEqual(len(surrogate.features), 50)
+
+    def testSurrogateSelection(self):
+        rng = np.random.default_rng(2)
+        surrogate = SurrogateModel(oversample = 3, exploration = 0.2, min_samples = 100)
+
+        # nothing is screened before the model has seen enough creatures
+        self.assertEqual(surrogate.get_num_candidates(10), 10)
+        dna, lengths = random_batch(10, rng)
+        self.assertEqual(surrogate.select(dna, lengths, 10, rng).tolist(), list(range(10)))
+        self.assertEqual(surrogate.n_screened_out, 0)
+        surrogate.score(np.zeros(10))
+        self.assertTrue(np.isnan(surrogate.correlation))
+
+        dna, lengths = random_batch(200, rng)
+        surrogate.update(dna, lengths, lengths.astype(float))
+        self.assertEqual(surrogate.get_num_candidates(10), 30)
+        dna, lengths = random_batch(30, rng)
+        selected = surrogate.select(dna, lengths, 10, rng)
+        self.assertEqual(len(selected), 10)
+        self.assertEqual(len(np.unique(selected)), 10)
+        self.assertEqual(surrogate.n_screened_out, 20)
+        # the best predicted come first, the two explored ones last
+        predictions = surrogate.predict(dna, lengths)
+        self.assertEqual(sorted(selected[:8].tolist()), sorted(np.argsort(-predictions, kind = "stable")[:8].tolist()))
+
+        surrogate.score(lengths[selected].astype(float))
+        self.assertGreater(surrogate.correlation, 0.5)
+        self.assertGreaterEqual(surrogate.error, 0)
+        self.assertIsNone(surrogate.pending)
+
+        # children replaced after selection are left out of the score
+        selected = surrogate.select(dna, lengths, 10, rng)
+        predictions = surrogate.pending.copy()
+        surrogate.score(predictions[1:] + 1, np.arange(1, 10))
+        self.assertAlmostEqual(surrogate.error, 1)
+        self.assertAlmostEqual(surrogate.correlation, 1)
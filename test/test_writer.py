@@ -0,0 +1,58 @@
+import time
+import threading
+import unittest
+import numpy as np
+from app import writer
+from creatures import population
+
+class AsyncWriterTest(unittest.TestCase):
+    def testWritesInOrder(self):
+        self.assertIsNotNone(writer.AsyncWriter)
+
+        written = []
+        with writer.AsyncWriter(2) as async_writer:
+            for i in range(10):
+                async_writer.submit(written.append, i)
+            async_writer.flush()
+            self.assertEqual(written, list(range(10)))
+            async_writer.submit(written.append, 10)
+        # closing finishes pending writes
+        self.assertEqual(written, list(range(11)))
+        with self.assertRaises(Exception):
+            async_writer.submit(written.append, 11)
+
+    def testBackPressure(self):
+        release = threading.Event()
+        async_writer = writer.AsyncWriter(1)
+        async_writer.submit(release.wait)
+        async_writer.submit(time.sleep, 0)
+
+        # the queue is full while the first write is blocked
+        submitted = threading.Event()
+        thread = threading.Thread(target = lambda: (async_writer.submit(time.sleep, 0), submitted.set()))
+        thread.start()
+        self.assertFalse(submitted.wait(0.2))
+        release.set()
+        self.assertTrue(submitted.wait(5))
+        thread.join()
+        async_writer.close()
+
+    def testErrorsAreRaised(self):
+        async_writer = writer.AsyncWriter()
+        async_writer.submit(int, "not a number")
+        with self.assertRaises(ValueError):
+            async_writer.flush()
+        async_writer.close()
+
+    def testSnapshotIsImmutable(self):
+        pop = population.Population(4, 3)
+        snapshot = pop.get_snapshot()
+        self.assertEqual(len(snapshot["dna"]), sum(len(cr.dna) for cr in pop.creatures))
+        self.assertEqual(snapshot["lengths"].tolist(), [len(cr.dna) for cr in pop.creatures])
+        with self.assertRaises(ValueError):
+            snapshot["dna"][0, 0] = 0
+
+        # later changes to the population do not reach the snapshot
+        dna = np.array(snapshot["dna"])
+        pop.creatures[0].dna[:] = 0.5
+        self.assertTrue((snapshot["dna"] == dna).all())